@@ -0,0 +1,212 @@
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import insepa
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Parâmetros
+# ────────────────────────────────────────────────────────────────────────────────
+# Quantidade de blocos (e de frases do corpus) em cada escala
+ESCALAS_PADRAO = (1_000, 10_000, 100_000, 1_000_000)
+
+# Piora relativa acima da qual a comparação acusa regressão
+TOLERANCIA = 0.10
+
+# Diferenças absolutas menores que isso são ruído de medição (segundos)
+PISO_SEGUNDOS = 0.001
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Corpus sintético
+# ────────────────────────────────────────────────────────────────────────────────
+# Sílabas e pontuação com frequências aproximadas do português escrito; o
+# gerador é determinístico para a mesma semente
+SILABAS = (
+    "a", "e", "o", "de", "da", "do", "que", "se", "ra", "re", "ri", "ta", "te",
+    "ti", "to", "ca", "co", "ma", "me", "mo", "na", "ne", "no", "pa", "po", "la",
+    "li", "lo", "sa", "so", "men", "con", "com", "por", "pa", "em", "es", "in",
+    "an", "al", "vi", "va", "vo", "gu", "lhe", "nha", "ci", "di", "fi", "mu",
+    "pre", "pro", "tra", "bra",
+)
+FINAIS = ("a", "o", "e", "os", "as", "ção", "ções", "ão", "ar", "er", "ir", "dade", "mente", "é", "á")
+PALAVRAS_CURTAS = ("o", "a", "os", "as", "de", "do", "da", "em", "no", "na", "um", "uma", "e", "que")
+PONTUACAO = (".", ".", ".", ".", "?", "!")
+
+def gerar_palavra(rng):
+    if rng.random() < 0.35:
+        return rng.choice(PALAVRAS_CURTAS)
+    return "".join(rng.choice(SILABAS) for _ in range(rng.randint(0, 3))) + rng.choice(FINAIS)
+
+def gerar_frase(rng):
+    palavras = [gerar_palavra(rng) for _ in range(rng.randint(3, 14))]
+    palavras[0] = palavras[0].capitalize()
+    if len(palavras) > 6 and rng.random() < 0.4:
+        palavras[rng.randrange(2, len(palavras) - 2)] += ","
+    return " ".join(palavras) + rng.choice(PONTUACAO)
+
+def gerar_frases(n, semente=0):
+    rng = random.Random(semente)
+    return [gerar_frase(rng) for _ in range(n)]
+
+def gerar_corpus(n, semente=0):
+    return " ".join(gerar_frases(n, semente))
+
+def gerar_subcon(n_blocos, semente=0, frases=None):
+    # Subconsciente de uma única mãe com `n_blocos` blocos de uma saída cada,
+    # montado pelo mesmo caminho que o app usa ao salvar um bloco
+    frases = frases or gerar_frases(n_blocos + 1, semente)
+    data = {
+        "maes": {"0": {"nome": "Bench", "ultimo_child": "0.0", "proximo_bloco": 1, "blocos": []}},
+        "proximo_mae": 1
+    }
+    blocos = data["maes"]["0"]["blocos"]
+    for i in range(n_blocos):
+        bloco, last_idx = insepa.create_entrada_block(data, "0", frases[i], "", "")
+        blocos.append(bloco)
+        insepa.add_saida_to_block(data, "0", bloco, last_idx, frases[i + 1], "", "")
+    return data
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Medição
+# ────────────────────────────────────────────────────────────────────────────────
+def medir(func, repeticoes=3, memoria=True):
+    # Tempo: melhor e mediana de `repeticoes` execuções, sem tracemalloc
+    # ligado. Memória: pico de uma execução extra, já que o tracemalloc
+    # deixa o código bem mais lento
+    tempos = []
+    for _ in range(repeticoes):
+        gc.collect()
+        t0 = time.perf_counter()
+        resultado = func()
+        tempos.append(time.perf_counter() - t0)
+        del resultado
+    medida = {"segundos": min(tempos), "mediana": statistics.median(tempos)}
+    if memoria:
+        gc.collect()
+        tracemalloc.start()
+        resultado = func()
+        medida["pico_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del resultado
+    return medida
+
+def casos(escala, semente, pasta):
+    # (nome, função) de cada etapa medida nesta escala
+    frases  = gerar_frases(escala + 1, semente)
+    corpus  = " ".join(frases)
+    data    = gerar_subcon(escala, semente, frases)
+    arquivo = pasta / f"subcon_{escala}.json"
+    insepa.save_json(arquivo, data, insepa.codificar_subcon)
+    return [
+        ("segment_text", lambda: insepa.segment_text(corpus)),
+        ("insepa_tokenizar_texto", lambda: insepa.insepa_tokenizar_texto("1", corpus)),
+        ("calcular_alnulu", lambda: [insepa.calcular_alnulu(f) for f in frases]),
+        ("get_last_index", lambda: insepa.get_last_index(data["maes"]["0"])),
+        ("create_entrada_block+add_saida_to_block", lambda: gerar_subcon(escala, semente, frases)),
+        ("save_json", lambda: insepa.save_json(arquivo, data, insepa.codificar_subcon)),
+        ("load_json", lambda: insepa.load_json(arquivo, None, insepa.decodificar_subcon)),
+    ]
+
+def rodar(escalas, repeticoes=3, memoria=True, semente=0, saida=sys.stdout):
+    resultados = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for escala in escalas:
+            resultados[str(escala)] = medidas = {}
+            for nome, func in casos(escala, semente, Path(tmp)):
+                medidas[nome] = medir(func, repeticoes, memoria)
+                print(formatar(escala, nome, medidas[nome]), file=saida, flush=True)
+            gc.collect()
+    return {
+        "meta": {
+            "data":       time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python":     platform.python_version(),
+            "plataforma": platform.platform(),
+            "numpy":      insepa.np is not None,
+            "semente":    semente,
+            "repeticoes": repeticoes,
+        },
+        "resultados": resultados,
+    }
+
+def formatar(escala, nome, medida):
+    linha = f"{escala:>9}  {nome:<42} {medida['segundos'] * 1000:11.2f} ms"
+    if "pico_bytes" in medida:
+        linha += f" {medida['pico_bytes'] / 2**20:10.1f} MiB"
+    return linha
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Comparação entre execuções
+# ────────────────────────────────────────────────────────────────────────────────
+def comparar(base, novo, tolerancia=TOLERANCIA, piso=PISO_SEGUNDOS):
+    # Devolve (escala, etapa, métrica, antes, depois, razão) de cada medida
+    # que piorou mais que a tolerância, nas escalas e etapas presentes nos dois
+    regressoes = []
+    for escala, etapas in novo["resultados"].items():
+        for nome, depois in etapas.items():
+            antes = base["resultados"].get(escala, {}).get(nome)
+            if antes is None:
+                continue
+            for metrica in ("segundos", "pico_bytes"):
+                if metrica not in antes or metrica not in depois:
+                    continue
+                a, d = antes[metrica], depois[metrica]
+                if metrica == "segundos" and d - a < piso:
+                    continue
+                razao = d / a if a else float("inf")
+                if razao > 1 + tolerancia:
+                    regressoes.append((escala, nome, metrica, a, d, razao))
+    return regressoes
+
+def relatar(regressoes, saida=sys.stdout):
+    if not regressoes:
+        print("Nenhuma regressão.", file=saida)
+        return
+    for escala, nome, metrica, a, d, razao in regressoes:
+        print(f"REGRESSÃO {escala:>9}  {nome:<42} {metrica:<10} {a:.6g} → {d:.6g} ({razao:.2f}x)", file=saida)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Linha de comando
+# ────────────────────────────────────────────────────────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline INSEPA")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    rod = sub.add_parser("rodar", help="mede cada etapa nas escalas pedidas")
+    rod.add_argument("--escalas", type=int, nargs="+", default=ESCALAS_PADRAO, help="quantidades de blocos")
+    rod.add_argument("--repeticoes", type=int, default=3)
+    rod.add_argument("--semente", type=int, default=0)
+    rod.add_argument("--sem-memoria", action="store_true", help="pula a medição de pico com tracemalloc")
+    rod.add_argument("--saida", type=Path, default=Path("bench_insepa.json"))
+    rod.add_argument("--base", type=Path, help="resultado anterior para comparar ao final")
+    rod.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+
+    cmp_ = sub.add_parser("comparar", help="aponta regressões entre dois resultados")
+    cmp_.add_argument("base", type=Path)
+    cmp_.add_argument("novo", type=Path)
+    cmp_.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+
+    args = parser.parse_args(argv)
+    if args.comando == "rodar":
+        res = rodar(args.escalas, args.repeticoes, not args.sem_memoria, args.semente)
+        args.saida.write_text(json.dumps(res, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Resultados gravados em {args.saida}")
+        if not args.base:
+            return 0
+        base, novo = json.loads(args.base.read_text(encoding="utf-8")), res
+    else:
+        base = json.loads(args.base.read_text(encoding="utf-8"))
+        novo = json.loads(args.novo.read_text(encoding="utf-8"))
+    regressoes = comparar(base, novo, args.tolerancia)
+    relatar(regressoes)
+    return 1 if regressoes else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2083 @@
+import argparse
+import bisect
+import codecs
+import copy
+import gc
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+import uuid
+from collections import deque
+from collections.abc import Sequence
+from contextlib import contextmanager, nullcontext
+from itertools import repeat
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional: sem ele o lote usa o caminho puro
+    np = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: travas via msvcrt
+    fcntl = None
+    import msvcrt
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Caminhos fixos
+# ────────────────────────────────────────────────────────────────────────────────
+SCRIPT_DIR = Path(__file__).parent.resolve()
+SUB_FILE   = SCRIPT_DIR / "adam_memoria.json"
+INC_FILE   = SCRIPT_DIR / "inconsciente.json"
+SUB_DIARIO = SCRIPT_DIR / "adam_memoria.journal.jsonl"
+INC_DIARIO = SCRIPT_DIR / "inconsciente.journal.jsonl"
+TEXTOS_DIR = SCRIPT_DIR / "inconsciente_textos"
+# Um banco por armazenamento: cada um tem a sua tabela meta e o seu
+# PRAGMA data_version, sem uma escrita no inconsciente invalidar o subconsciente
+SUB_DB     = SCRIPT_DIR / "adam_memoria.db"
+INC_DB     = SCRIPT_DIR / "inconsciente.db"
+
+# Backend de persistência: "json" (snapshot + diário) ou "sqlite"
+BACKEND = os.environ.get("INSEPA_BACKEND", "json")
+
+# Bytes lidos por vez na ingestão de uploads grandes
+TAMANHO_PEDACO = 1 << 20
+
+# Perfil de execução: ligado por padrão com INSEPA_PERFIL=1; as medições
+# exportadas vão, uma linha por rerun, para PERFIL_ARQUIVO
+PERFIL_ATIVO   = os.environ.get("INSEPA_PERFIL") == "1"
+PERFIL_ARQUIVO = Path(os.environ.get("INSEPA_PERFIL_ARQUIVO", SCRIPT_DIR / "perfil.jsonl"))
+
+# Quantidade de operações no diário que dispara a compactação do snapshot
+DIARIO_LIMITE_OPS = 200
+
+# True grava os tokens como listas explícitas ("0.1", "0.2", ...), o formato
+# antigo; False grava uma string por faixa ("0.1-8") e omite o TOTAL derivável
+TOKENS_EXPANDIDOS = False
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Tokens em faixas
+# ────────────────────────────────────────────────────────────────────────────────
+class TokenFaixas(Sequence):
+    # Lista de tokens "mae.i" guardada como faixas contíguas [mae, início, qtd].
+    # Os ids explícitos só são montados quando alguém itera ou indexa.
+    __slots__ = ("faixas", "_n")
+
+    def __init__(self, faixas=()):
+        self.faixas = []
+        self._n     = 0
+        for mae, inicio, qtd in faixas:
+            self._anexar(str(mae), inicio, qtd)
+
+    @classmethod
+    def de_lista(cls, tokens):
+        fx = cls()
+        fx._ler(tokens)
+        return fx
+
+    def _ler(self, tokens):
+        # Aceita ids soltos ("0.7", o formato expandido) e faixas ("0.7-14")
+        for tok in tokens:
+            mae, _, idx = tok.rpartition(".")
+            inicio, _, fim = idx.partition("-")
+            inicio = int(inicio)
+            self._anexar(mae, inicio, int(fim) - inicio + 1 if fim else 1)
+
+    def _anexar(self, mae, inicio, qtd):
+        if qtd <= 0:
+            return
+        ult = self.faixas[-1] if self.faixas else None
+        if ult and ult[0] == mae and ult[1] + ult[2] == inicio:
+            ult[2] += qtd
+        else:
+            self.faixas.append([mae, inicio, qtd])
+        self._n += qtd
+
+    def extend(self, tokens):
+        if isinstance(tokens, TokenFaixas):
+            for mae, inicio, qtd in tokens.faixas:
+                self._anexar(mae, inicio, qtd)
+        else:
+            self._ler(tokens)
+
+    def append(self, tok):
+        self.extend([tok])
+
+    def ultimo_indice(self):
+        return max((inicio + qtd - 1 for _, inicio, qtd in self.faixas), default=0)
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        for mae, inicio, qtd in self.faixas:
+            for i in range(inicio, inicio + qtd):
+                yield f"{mae}.{i}"
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return list(self)[pos]
+        if pos < 0:
+            pos += self._n
+        if not 0 <= pos < self._n:
+            raise IndexError("token fora da faixa")
+        for mae, inicio, qtd in self.faixas:
+            if pos < qtd:
+                return f"{mae}.{inicio + pos}"
+            pos -= qtd
+
+    def __eq__(self, other):
+        if isinstance(other, TokenFaixas):
+            return self.faixas == other.faixas
+        if isinstance(other, (list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"TokenFaixas({self.faixas!r})"
+
+    def para_json(self):
+        # Uma string por faixa: "mae.início-fim", ou só "mae.i" para um token
+        return [f"{m}.{i}-{i + q - 1}" if q > 1 else f"{m}.{i}" for m, i, q in self.faixas]
+
+def _ler_faixas(valor):
+    if not valor:
+        return TokenFaixas()
+    if isinstance(valor, dict):  # {"faixas": [[mae, início, qtd], ...]}
+        return TokenFaixas(valor["faixas"])
+    return TokenFaixas.de_lista(valor)
+
+def decodificar_tokens(tokens):
+    # Dict de tokens lido do disco → TokenFaixas por categoria. O TOTAL só é
+    # gravado quando é a única categoria (textos do inconsciente); nos blocos
+    # ele é refeito como a união de E/RE/CE (ou S/RS/CS)
+    toks, faixas = {}, []
+    for k, v in tokens.items():
+        if k != "TOTAL":
+            toks[k] = fx = _ler_faixas(v)
+            faixas += fx.faixas
+    if not toks:
+        return {"TOTAL": _ler_faixas(tokens["TOTAL"])}
+    if len(faixas) > 1:
+        faixas.sort(key=lambda f: f[1])
+    toks["TOTAL"] = total = TokenFaixas()
+    for mae, inicio, qtd in faixas:
+        total._anexar(mae, inicio, qtd)
+    return toks
+
+def codificar_tokens(tokens):
+    if TOKENS_EXPANDIDOS:
+        return {k: list(v) for k, v in tokens.items()}
+    if len(tokens) == 1:
+        return {k: v.para_json() for k, v in tokens.items()}
+    return {k: v.para_json() for k, v in tokens.items() if k != "TOTAL"}
+
+def _codificar_tokens(obj):
+    if isinstance(obj, TokenFaixas):
+        return list(obj) if TOKENS_EXPANDIDOS else obj.para_json()
+    raise TypeError(f"{type(obj).__name__} não é serializável em JSON")
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Perfil de execução (tempo por fase e contadores de cada rerun)
+# ────────────────────────────────────────────────────────────────────────────────
+class _Medida:
+    __slots__ = ("fases", "fase", "t0")
+
+    def __init__(self, fases, fase):
+        self.fases = fases
+        self.fase  = fase
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.fases[self.fase] = self.fases.get(self.fase, 0.0) + time.perf_counter() - self.t0
+
+_SEM_MEDIDA = nullcontext()
+
+class Perfil:
+    # Cada thread (rerun do Streamlit) mede a si mesma, entre iniciar() e
+    # concluir(). Fora disso medir() devolve sempre o mesmo nullcontext e
+    # contar() não faz nada, então os ganchos quase não custam desligados.
+    # Fases aninhadas somam nas duas (o tempo de "aplicar_ops" inclui o de
+    # "tokenizacao" feito dentro dela).
+    def __init__(self, limite=20):
+        self._local   = threading.local()
+        self.recentes = deque(maxlen=limite)
+        self.trava    = threading.Lock()
+        self.abertas  = 0  # medições em curso em todas as threads
+
+    def iniciar(self, rotulo="", arquivo=None):
+        # Devolve a medição em curso: quem chama pode concluí-la depois, de
+        # outra thread, se o rerun for cortado antes do fim
+        with self.trava:
+            self.abertas += 1
+        self._local.atual = {
+            "rotulo": rotulo, "inicio": time.time(), "t0": time.perf_counter(),
+            "fases": {}, "contadores": {}, "arquivo": arquivo
+        }
+        return self._local.atual
+
+    def medir(self, fase):
+        if not self.abertas:
+            return _SEM_MEDIDA
+        atual = getattr(self._local, "atual", None)
+        if atual is None:
+            return _SEM_MEDIDA
+        return _Medida(atual["fases"], fase)
+
+    def contar(self, nome, n=1):
+        if not self.abertas:
+            return
+        atual = getattr(self._local, "atual", None)
+        if atual is not None:
+            atual["contadores"][nome] = atual["contadores"].get(nome, 0) + n
+
+    def concluir(self, atual=None, interrompido=False):
+        # Fecha a medição (a da thread, se nenhuma for passada) e devolve o
+        # registro; None se ela já tinha sido concluída
+        da_thread = getattr(self._local, "atual", None)
+        if atual is None:
+            atual = da_thread
+        if atual is da_thread:
+            self._local.atual = None
+        if atual is None or "t0" not in atual:
+            return None
+        registro = {
+            "rotulo":     atual["rotulo"],
+            "inicio":     atual["inicio"],
+            "total":      time.perf_counter() - atual.pop("t0"),
+            "fases":      atual["fases"],
+            "contadores": atual["contadores"],
+        }
+        if interrompido:
+            registro["interrompido"] = True
+        with self.trava:
+            self.abertas -= 1
+            self.recentes.append(registro)
+            if atual["arquivo"]:
+                with open(atual["arquivo"], "a", encoding="utf-8") as f:
+                    f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        return registro
+
+perfil = Perfil()
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Helpers para JSON
+# ────────────────────────────────────────────────────────────────────────────────
+@contextmanager
+def _sem_gc():
+    # Montar milhões de objetos dispara o coletor cíclico várias vezes, e cada
+    # passada percorre tudo o que já foi montado; o JSON lido não tem ciclos
+    ligado = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if ligado:
+            gc.enable()
+
+def load_json(path: Path, default, decodificar=None):
+    # `decodificar` percorre só as partes do documento que guardam tokens
+    if path.exists():
+        with perfil.medir("json_leitura"):
+            dados = path.read_bytes()
+            perfil.contar("bytes_lidos", len(dados))
+            if dados.strip():
+                with _sem_gc():
+                    dados = json.loads(dados.decode("utf-8"))
+                    return decodificar(dados) if decodificar else dados
+    return default
+
+def save_json(path: Path, data, codificar=None):
+    # Grava num arquivo temporário e troca por rename atômico: uma queda no
+    # meio da escrita nunca deixa o JSON truncado. Sem indentação: com ela,
+    # cada faixa de tokens ocupava várias linhas
+    tmp = path.with_name(path.name + ".tmp")
+    with perfil.medir("json_escrita"):
+        with _sem_gc():
+            dados = json.dumps(
+                codificar(data) if codificar else data,
+                ensure_ascii=False, separators=(",", ":"), default=_codificar_tokens
+            ).encode("utf-8")
+        with open(tmp, "wb") as f:
+            f.write(dados)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    perfil.contar("bytes_escritos", len(dados))
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Cache em processo (sobrevive aos reruns do Streamlit)
+# ────────────────────────────────────────────────────────────────────────────────
+def assinatura_arquivos(*paths):
+    sig = []
+    for p in paths:
+        try:
+            info = os.stat(p)
+        except FileNotFoundError:
+            sig.append(None)
+        else:
+            sig.append((info.st_mtime_ns, info.st_size))
+    return tuple(sig)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Travas entre processos
+# ────────────────────────────────────────────────────────────────────────────────
+@contextmanager
+def trava_arquivo(path: Path, exclusiva=True):
+    # Trava consultiva num arquivo ao lado dos dados. Sem fcntl (Windows) toda
+    # trava é exclusiva
+    with open(path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusiva else fcntl.LOCK_SH)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # LK_LOCK desiste após ~10 s; continua esperando
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class Conflito(KeyError):
+    # O alvo da operação (mãe, bloco, texto) foi removido por outra sessão
+    pass
+
+class Duplicado(Conflito):
+    # A entrada do bloco já foi gravada (por esta ou por outra sessão)
+    pass
+
+# Operações que mexem em contadores globais e não podem correr em paralelo
+# com nenhuma outra escrita; as demais travam só a própria mãe
+OPS_GLOBAIS = ("add_mae", "remove_mae")
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Interface de armazenamento
+# ────────────────────────────────────────────────────────────────────────────────
+class Armazenamento:
+    # Todo backend mantém os dados em memória e expõe:
+    #   obter()          dados atuais (relidos só se outro processo gravou)
+    #   vista()          cópia rasa dos dados atuais para ler sem trava
+    #   registrar(op)    aplica e persiste uma operação, devolvendo o resultado
+    #   substituir(data) grava um conjunto completo de dados (migração)
+    #   compactar()      arrumação periódica do armazenamento
+    # `derivados` são estruturas mantidas junto com os dados (índices etc.):
+    # recebem cada operação antes e depois de aplicada e, em registrar(),
+    # podem recusar ou ajustar a operação nova em preparar(). `finalizar(op,
+    # resultado, gravada)` roda depois do commit (ou da falha) de registrar():
+    # efeitos fora dos dados, como apagar arquivos, só acontecem ali.
+    # As operações descrevem a intenção ("acrescente estes blocos à mãe 3"),
+    # não o resultado: registrar() primeiro alcança o que outras sessões
+    # gravaram e só então aplica, então ids e tokens saem sempre do estado
+    # mais recente.
+    derivados = {}
+    finalizar = None
+    copiar    = None
+
+    def obter(self):
+        raise NotImplementedError
+
+    def vista(self):
+        with self.trava:
+            self.obter()
+            return self._copiar_vista()
+
+    def _copiar_vista(self):
+        # Outras sessões aplicam operações no mesmo `data`, no lugar. Quem
+        # percorre os dados sem segurar a trava (um rerun do Streamlit) recebe
+        # uma cópia das estruturas que as operações alteram — dicts e listas,
+        # não os blocos/textos em si —, refeita só quando a versão muda.
+        # Chamado com `trava`
+        if self.copiar is None:
+            return self.data
+        if getattr(self, "_vista_versao", None) != self.versao:
+            self._vista, self._vista_versao = self.copiar(self.data), self.versao
+        return self._vista
+
+    def registrar(self, op):
+        raise NotImplementedError
+
+    def substituir(self, data):
+        raise NotImplementedError
+
+    def compactar(self):
+        pass
+
+    def _finalizar(self, op, resultado, gravada):
+        if self.finalizar:
+            self.finalizar(op, resultado, gravada)
+
+    def _preparar(self, op):
+        # Só para operações novas (nunca no replay), com a trava de escrita
+        for d in self.derivados.values():
+            op = d.preparar(self.data, op)
+        return op
+
+    def _aplicar(self, op):
+        with perfil.medir("aplicar_ops"):
+            return self._aplicar_op(op)
+
+    def _aplicar_op(self, op):
+        # Sem desfazer: se um gancho ou a operação falha no meio, dados e
+        # derivados ficam pela metade, e quem chama descarta `data` para reler
+        try:
+            for d in self.derivados.values():
+                d.antes_op(self.data, op)
+            resultado = self.aplicar(self.data, op)
+        except KeyError as e:
+            raise Conflito(f"{e.args[0] if e.args else e} (alterado por outra sessão?)") from e
+        for d in self.derivados.values():
+            d.depois_op(self.data, op, resultado)
+        return resultado
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Diário de operações (write-ahead journal)
+# ────────────────────────────────────────────────────────────────────────────────
+class Diario(Armazenamento):
+    # Snapshot JSON + diário append-only com uma operação por linha. Cada
+    # linha carrega a geração do snapshot sobre o qual foi aplicada; ao
+    # compactar, a geração sobe e as linhas antigas deixam de ser reaplicadas,
+    # mesmo que a queda aconteça antes de o diário ser truncado. Os derivados
+    # são gravados ao lado do snapshot na compactação.
+    #
+    # Vários processos podem gravar nos mesmos arquivos. Cada escrita segura a
+    # trava global compartilhada + a trava da mãe só durante o commit: lê as
+    # linhas que os outros anexaram desde `offset`, aplica a operação e anexa
+    # a sua. Operações em mães diferentes comutam, então a ordem no arquivo
+    # não importa entre elas. add_mae/remove_mae e a compactação pegam a trava
+    # global exclusiva.
+    #
+    # Dentro do processo, as threads de uma mesma mãe se revezam numa trava
+    # local da mãe, e `trava` (a dos dados em memória) só cobre o trabalho em
+    # memória e a escrita da linha: o fsync e a compactação, que roda numa
+    # thread própria, ficam fora dela. As travas são pegas sempre nesta ordem:
+    # mãe local → arquivo global → arquivo da mãe → `trava`.
+    def __init__(self, snapshot: Path, diario: Path, default, aplicar,
+                 normalizar=None, limite=DIARIO_LIMITE_OPS, derivados=None, finalizar=None,
+                 copiar=None, codificar=None, decodificar=None):
+        self.snapshot   = snapshot
+        self.diario     = diario
+        self.finalizar  = finalizar
+        self.copiar     = copiar
+        self.default    = default
+        self.aplicar    = aplicar
+        self.normalizar = normalizar
+        # Conversão dos tokens entre a memória e o snapshot
+        self.codificar   = codificar
+        self.decodificar = decodificar
+        self.limite     = limite
+        self.data       = None
+        self.pendentes  = 0
+        self.offset     = 0
+        self.sujo       = False
+        self.assinatura = None
+        self.versao     = 0
+        self.derivados  = derivados or {}
+        self.trava        = threading.RLock()
+        self.trava_global = snapshot.with_name(snapshot.name + ".lock")
+        self.travas_maes  = {}
+        self.compactando  = None
+
+    def _arquivo_trava_mae(self, mae_id):
+        return self.snapshot.with_name(f"{self.snapshot.name}.{mae_id}.lock")
+
+    def _trava_mae(self, mae_id):
+        return trava_arquivo(self._arquivo_trava_mae(mae_id))
+
+    def _trava_local(self, mae_id):
+        if mae_id is None:
+            return nullcontext()
+        with self.trava:
+            return self.travas_maes.setdefault(mae_id, threading.Lock())
+
+    def _limpar_travas(self):
+        # Só com a trava global exclusiva: nenhum escritor de mãe está dentro
+        # do commit, e ids de mãe removida nunca voltam a ser usados
+        maes = self.data.get("maes", {})
+        for p in self.snapshot.parent.glob(f"{self.snapshot.name}.*.lock"):
+            if p.name[len(self.snapshot.name) + 1:-len(".lock")] not in maes:
+                p.unlink(missing_ok=True)
+
+    def _em_dia(self):
+        return self.data is not None and assinatura_arquivos(self.snapshot, self.diario) == self.assinatura
+
+    def obter(self):
+        # Reaproveita a estrutura já carregada enquanto nenhum outro processo
+        # tiver mexido no snapshot ou no diário (checagem só por stat)
+        with self.trava:
+            if self._em_dia():
+                return self.data
+        with trava_arquivo(self.trava_global, exclusiva=False), self.trava:
+            if not self._em_dia():
+                self._sincronizar()
+            data = self.data
+        self._agendar_compactacao()
+        return data
+
+    def vista(self):
+        # A cópia é feita sobre o `data` atual, com `trava`; obter() fica fora
+        # dela por causa da ordem das travas
+        while True:
+            data = self.obter()
+            with self.trava:
+                if self.data is data:
+                    return self._copiar_vista()
+
+    def carregar(self):
+        assinatura = assinatura_arquivos(self.snapshot, self.diario)
+        self.data = load_json(self.snapshot, copy.deepcopy(self.default), self.decodificar)
+        self.sujo = False
+        if self.normalizar:
+            self.data, self.sujo = self.normalizar(self.data)
+        geracao = self.data.get("geracao", 0)
+        with perfil.medir("indices"):
+            for d in self.derivados.values():
+                if self.sujo or not d.carregar(geracao):
+                    d.reconstruir(self.data)
+        self.pendentes = 0
+        self.offset = self._ler_diario(0)
+        self.assinatura = assinatura
+        self.versao += 1
+        return self.data
+
+    def _ler_diario(self, desde, pular=None):
+        # Aplica as linhas completas a partir do byte `desde` e devolve onde
+        # parou. Uma linha sem "\n" ainda está sendo escrita por outro processo
+        if not self.diario.exists():
+            return 0
+        geracao = self.data.get("geracao", 0)
+        pos = desde
+        with open(self.diario, "rb") as f:
+            f.seek(desde)
+            for linha in f:
+                if not linha.endswith(b"\n"):
+                    break
+                inicio, pos = pos, pos + len(linha)
+                if inicio == pular or not linha.strip():
+                    continue
+                try:
+                    reg = json.loads(linha)
+                except json.JSONDecodeError:
+                    continue  # resto de uma escrita interrompida por queda
+                if reg.get("g") == geracao:
+                    self._aplicar(reg["op"])
+                    self.pendentes += 1
+                    self.versao += 1
+        perfil.contar("bytes_lidos", pos - desde)
+        return pos
+
+    def _sincronizar(self):
+        # Relê tudo se o snapshot mudou (outro processo compactou); senão só
+        # aplica as linhas novas do diário. Chamado com alguma trava de arquivo
+        assinatura = assinatura_arquivos(self.snapshot, self.diario)
+        tamanho = assinatura[1][1] if assinatura[1] else 0
+        with perfil.medir("sincronizar"):
+            try:
+                if self.data is None or assinatura[0] != self.assinatura[0] or tamanho < self.offset:
+                    self.carregar()
+                elif assinatura != self.assinatura:
+                    self.offset = self._ler_diario(self.offset)
+                    self.assinatura = assinatura
+            except BaseException:
+                self.data = None  # replay interrompido: dados e derivados pela metade
+                raise
+
+    def _anexar(self, op):
+        # Uma única escrita O_APPEND por operação; o "\n" inicial isola o resto
+        # de uma linha cortada por queda. Devolve o arquivo, ainda aberto para
+        # o fsync, e o byte onde a linha começa
+        linha = json.dumps({"g": self.data.get("geracao", 0), "op": op}, ensure_ascii=False).encode("utf-8")
+        perfil.contar("bytes_escritos", len(linha) + 2)
+        f = open(self.diario, "ab", buffering=0)
+        try:
+            f.write(b"\n" + linha + b"\n")
+            return f, f.tell() - len(linha) - 1
+        except BaseException:
+            f.close()
+            raise
+
+    def registrar(self, op):
+        mae_id = None if op["op"] in OPS_GLOBAIS else op.get("mae_id")
+        with self._trava_local(mae_id), \
+             trava_arquivo(self.trava_global, exclusiva=mae_id is None), \
+             (self._trava_mae(mae_id) if mae_id is not None else nullcontext()):
+            with self.trava:
+                self._sincronizar()
+                try:
+                    op = self._preparar(op)  # recusa antes de mexer nos dados
+                except BaseException:
+                    self._finalizar(op, None, False)
+                    raise
+                try:
+                    resultado = self._aplicar(op)
+                    f, inicio = self._anexar(op)
+                except BaseException:
+                    # Aplicada em parte, ou só em memória: relê do disco
+                    self.data = None
+                    self._finalizar(op, None, False)
+                    raise
+                # Linhas de outras mães anexadas enquanto isso entram agora
+                assinatura = assinatura_arquivos(self.snapshot, self.diario)
+                self.offset = self._ler_diario(self.offset, pular=inicio)
+                self.assinatura = assinatura
+                self.pendentes += 1
+                self.versao += 1
+            # A mãe continua travada até a linha chegar ao disco
+            try:
+                with perfil.medir("diario_escrita"), f:
+                    os.fsync(f.fileno())
+            except BaseException:
+                with self.trava:
+                    self.data = None
+                self._finalizar(op, None, False)
+                raise
+            if op["op"] == "remove_mae":
+                self._arquivo_trava_mae(op["mae_id"]).unlink(missing_ok=True)
+                with self.trava:
+                    self.travas_maes.pop(op["mae_id"], None)
+        self._finalizar(op, resultado, True)
+        self._agendar_compactacao()
+        return resultado
+
+    def substituir(self, data):
+        with trava_arquivo(self.trava_global), self.trava:
+            self.data = data
+            with perfil.medir("indices"):
+                for d in self.derivados.values():
+                    d.reconstruir(self.data)
+            self._gravar_snapshot()
+            self.versao += 1
+
+    def compactar(self):
+        with trava_arquivo(self.trava_global):
+            with self.trava:
+                self._sincronizar()
+            self._gravar_snapshot()
+
+    def _agendar_compactacao(self):
+        # Regravar o snapshot custa O(corpus): fica para uma thread própria,
+        # uma de cada vez, fora do caminho de registrar() e obter()
+        with self.trava:
+            if not (self.sujo or self.pendentes >= self.limite) or self.compactando:
+                return
+            self.compactando = threading.Thread(target=self._compactar_se_preciso, name="compactacao")
+        self.compactando.start()
+
+    def _compactar_se_preciso(self):
+        try:
+            with trava_arquivo(self.trava_global):
+                with self.trava:
+                    self._sincronizar()  # outro processo pode ter compactado antes
+                    if not (self.sujo or self.pendentes >= self.limite):
+                        return
+                self._gravar_snapshot()
+        finally:
+            with self.trava:
+                self.compactando = None
+
+    def _gravar_snapshot(self):
+        # Com a trava global exclusiva nenhum escritor, deste ou de outro
+        # processo, mexe nos dados: só a troca do estado no fim pega `trava`,
+        # e as vistas continuam sendo servidas enquanto o snapshot é gravado
+        geracao = self.data.get("geracao", 0) + 1
+        self.data["geracao"] = geracao
+        save_json(self.snapshot, self.data, self.codificar)
+        for d in self.derivados.values():
+            d.salvar(geracao)
+        with open(self.diario, "w", encoding="utf-8"):
+            pass
+        self._limpar_travas()
+        with self.trava:
+            self.pendentes  = 0
+            self.offset     = 0
+            self.sujo       = False
+            self.assinatura = assinatura_arquivos(self.snapshot, self.diario)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Funções de tokenização e INSEPA
+# ────────────────────────────────────────────────────────────────────────────────
+def nova_mae(data, nome):
+    # Ids de mãe nunca são reaproveitados: são o prefixo dos tokens da mãe
+    new_id = str(data["proximo_mae"])
+    data["proximo_mae"] += 1
+    data["maes"][new_id] = {
+        "nome": nome,
+        "ultimo_child": f"{new_id}.0",
+        "proximo_bloco": 1,
+        "blocos": []
+    }
+    return new_id
+
+def posicao_bloco(blocos, bloco_id):
+    # bloco_id só cresce e remoções preservam a ordem: a lista fica ordenada
+    pos = bisect.bisect_left(blocos, bloco_id, key=lambda b: b["bloco_id"])
+    if pos == len(blocos) or blocos[pos]["bloco_id"] != bloco_id:
+        raise KeyError(f"Bloco {bloco_id} não encontrado")
+    return pos
+
+def segment_text(text):
+    parts = re.split(r'(?<=[.?!])\s+', text.strip())
+    return [p.strip() for p in parts if p.strip()]
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Motor de unidades INSEPA (palavras e sequências de pontuação)
+# ────────────────────────────────────────────────────────────────────────────────
+PADRAO_UNIDADE = re.compile(r'\w+|[^\w\s]+', re.UNICODE)
+
+def contar_unidades(texto):
+    # subn conta as ocorrências sem montar a lista de substrings do findall
+    return PADRAO_UNIDADE.subn("", texto)[1] if texto else 0
+
+def contar_unidades_lote(textos):
+    return [contar_unidades(t) for t in textos]
+
+def spans_unidades(texto):
+    # (início, fim) de cada unidade; o texto do token i é texto[ini:fim]
+    return [m.span() for m in PADRAO_UNIDADE.finditer(texto)]
+
+def spans_unidades_lote(textos):
+    return [spans_unidades(t) for t in textos]
+
+ALNULU_MAPA = {
+    'A':1,'B':2,'C':3,'D':4,'E':5,'F':6,'G':7,'H':8,'I':9,
+    'J':-10,'K':11,'L':12,'M':-13,'N':14,'O':15,'P':16,
+    'Q':17,'R':18,'S':19,'T':20,'U':21,'V':-22,'W':23,
+    'X':24,'Y':-25,'Z':26,'.':2,'!':3,'?':4,',':1,';':1,':':1,'-':1,
+    '0':0,'1':1,'2':2,'3':3,'4':4,'5':5,'6':6,'7':7,'8':8,'9':9
+}
+ALNULU_EQUIV = {
+    'Á':'A','À':'A','Â':'A','Ã':'A','Ä':'A',
+    'É':'E','Ê':'E','È':'E',
+    'Í':'I','Ì':'I','Î':'I',
+    'Ó':'O','Ò':'O','Ô':'O','Õ':'O','Ö':'O',
+    'Ú':'U','Ù':'U','Û':'U','Ü':'U','Ç':'C','Ñ':'N'
+}
+
+# Valor final de cada caractere (já em maiúsculas), com a equivalência dos
+# acentos aplicada; só entram os que valem algo
+_ALNULU_VALOR = {
+    c: v for c in {**ALNULU_MAPA, **ALNULU_EQUIV}
+    if (v := ALNULU_MAPA.get(ALNULU_EQUIV.get(c, c), 0))
+}
+
+if np is not None:
+    # Tabela por code point; tudo acima de U+00FF cai na última posição (0)
+    _ALNULU_TABELA = np.zeros(257, dtype=np.int64)
+    for _c, _v in _ALNULU_VALOR.items():
+        _ALNULU_TABELA[ord(_c)] = _v
+
+def calcular_alnulu(texto):
+    # Uma passada só: cada caractere é consultado na tabela (0 se não vale nada)
+    return sum(map(_ALNULU_VALOR.get, texto.upper(), repeat(0)))
+
+def calcular_alnulu_lote(textos):
+    # Mesmo resultado de [calcular_alnulu(t) for t in textos], somando os
+    # valores de todos os code points de uma vez com NumPy quando disponível
+    if np is None or len(textos) < 2:
+        return [calcular_alnulu(t) for t in textos]
+    ups  = [t.upper() for t in textos]
+    cps  = np.frombuffer("".join(ups).encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+    acum = np.concatenate(([0], np.cumsum(_ALNULU_TABELA[np.minimum(cps, 256)])))
+    fins = np.cumsum([len(u) for u in ups])
+    return (acum[fins] - acum[fins - [len(u) for u in ups]]).tolist()
+
+def get_last_index(mae):
+    # Varredura completa: usada só para reconstruir o contador da mãe
+    last = 0
+    for bloco in mae.get("blocos", []):
+        last = max(last, bloco["entrada"]["tokens"]["TOTAL"].ultimo_indice())
+        for saida in bloco.get("saidas", []):
+            last = max(last, saida["tokens"]["TOTAL"].ultimo_indice())
+    return last
+
+def ultimo_indice(mae):
+    # ultimo_child é gravado como "mae.N"; arquivos antigos podem ter um int
+    valor = mae.get("ultimo_child")
+    if isinstance(valor, int):
+        return valor
+    return int(str(valor).split(".")[1])
+
+def set_ultimo_indice(mae, mae_id, idx):
+    mae["ultimo_child"] = f"{mae_id}.{idx}"
+
+def verificar_ultimo_child(maes_dict):
+    # Reconstrói, numa única passada pelos blocos, o contador de toda mãe cujo
+    # ultimo_child não esteja no formato "mae.N" com o prefixo da própria mãe
+    reparadas = []
+    for mid, mae in maes_dict.items():
+        valor = mae.get("ultimo_child")
+        if isinstance(valor, str) and re.fullmatch(rf"{mid}\.\d+", valor):
+            continue
+        set_ultimo_indice(mae, mid, get_last_index(mae))
+        reparadas.append(mid)
+    return reparadas
+
+def generate_tokens(mae_id, start, cnt_e, cnt_re, cnt_ce):
+    E     = TokenFaixas([(mae_id, start, cnt_e)])
+    RE    = TokenFaixas([(mae_id, start + cnt_e, cnt_re)])
+    CE    = TokenFaixas([(mae_id, start + cnt_e + cnt_re, cnt_ce)])
+    TOTAL = TokenFaixas([(mae_id, start, cnt_e + cnt_re + cnt_ce)])
+    return {"E": E, "RE": RE, "CE": CE, "TOTAL": TOTAL}, start + cnt_e + cnt_re + cnt_ce - 1
+
+# Sobe quando a normalização de hash_entrada muda: os hashes gravados são refeitos
+HASH_VERSAO = 2
+
+def normalizar_entrada(texto):
+    # Caixa, espaços e forma Unicode (NFC) não distinguem entradas; acentos
+    # sim ("avó" e "avô", "está" e "esta" são palavras diferentes)
+    return " ".join(unicodedata.normalize("NFC", texto.casefold()).split())
+
+def hash_entrada(texto, reacao, contexto):
+    # "Chave e fechadura": mesma entrada normalizada + reação + contexto → mesmo hash
+    partes = (normalizar_entrada(c) for c in (texto, reacao, contexto))
+    return hashlib.blake2b("\x1f".join(partes).encode("utf-8"), digest_size=16).hexdigest()
+
+def create_entrada_block(data, mae_id, texto, re_ent, ctx_ent, alnulu=None):
+    mae   = data["maes"][mae_id]
+    last0 = ultimo_indice(mae)
+
+    cnt_e, cnt_ce = contar_unidades_lote((texto, ctx_ent))
+
+    toks, last_idx = generate_tokens(
+        mae_id, last0 + 1,
+        cnt_e,
+        1 if re_ent else 0,
+        cnt_ce
+    )
+    set_ultimo_indice(mae, mae_id, last_idx)
+    bloco_id = mae["proximo_bloco"]
+    mae["proximo_bloco"] += 1
+    bloco = {
+        "bloco_id": bloco_id,
+        "entrada": {
+            "texto":    texto,
+            "reacao":   re_ent,
+            "contexto": ctx_ent,
+            "tokens":   toks,
+            "fim":      toks["TOTAL"][-1] if toks["TOTAL"] else "",
+            "alnulu":   calcular_alnulu(texto) if alnulu is None else alnulu,
+            "hash":     hash_entrada(texto, re_ent, ctx_ent)
+        },
+        "saidas": [],
+        "open": True
+    }
+    return bloco, last_idx
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Versão atualizada de add_saida_to_block
+# ────────────────────────────────────────────────────────────────────────────────
+def add_saida_to_block(data, mae_id, bloco, last_idx, seg, re_sai, ctx_sai):
+    cnt_s = contar_unidades(seg)
+
+    primeiro = (
+        not bloco["saidas"] or
+        bloco["saidas"][-1]["reacao"]   != re_sai or
+        bloco["saidas"][-1]["contexto"] != ctx_sai
+    )
+
+    cnt_re = (1 if re_sai else 0) if primeiro else 0
+    cnt_ce = contar_unidades(ctx_sai) if primeiro else 0
+
+    toks_raw, new_last = generate_tokens(
+        mae_id,
+        last_idx + 1,
+        cnt_e   = cnt_s,
+        cnt_re  = cnt_re,
+        cnt_ce  = cnt_ce
+    )
+    set_ultimo_indice(data["maes"][mae_id], mae_id, new_last)
+
+    if primeiro:
+        nova_saida = {
+            "textos":   [seg],
+            "reacao":   re_sai,
+            "contexto": ctx_sai,
+            "tokens": {
+                "S":     toks_raw["E"],
+                "RS":    toks_raw["RE"],
+                "CS":    toks_raw["CE"],
+                "TOTAL": toks_raw["TOTAL"]
+            },
+            "fim": toks_raw["TOTAL"][-1] if toks_raw["TOTAL"] else ""
+        }
+        bloco["saidas"].append(nova_saida)
+    else:
+        existente = bloco["saidas"][-1]
+        existente["textos"].append(seg)
+        existente["tokens"]["S"].extend(toks_raw["E"])
+        existente["tokens"]["TOTAL"].extend(toks_raw["E"])
+        if toks_raw["E"]:
+            existente["fim"] = toks_raw["E"][-1]
+
+    return new_last
+
+def registro_texto(text_id, n_units, alnulu, **conteudo):
+    tokens = TokenFaixas([(text_id, 1, n_units)])
+    return {
+        "nome":         f"Texto {text_id}",
+        **conteudo,
+        "tokens":       {"TOTAL": tokens},
+        "ultimo_child": tokens[-1] if tokens else "",
+        "fim":          tokens[-1] if tokens else "",
+        "alnulu":       alnulu
+    }
+
+def insepa_tokenizar_texto(text_id, texto):
+    with perfil.medir("tokenizacao"):
+        return registro_texto(text_id, contar_unidades(texto), calcular_alnulu(texto), texto=texto)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Construção de blocos (unitária e em lote)
+# ────────────────────────────────────────────────────────────────────────────────
+ESTRATEGIAS_PAREAMENTO = ("consecutivos", "janela")
+
+def parear_segmentos(segmentos, estrategia="consecutivos", janela=1):
+    # consecutivos: (1ª → 2ª), (3ª → 4ª), ...; uma frase final sem par vira
+    #               bloco sem saída
+    # janela:       cada frase é entrada e as `janela` seguintes são as saídas
+    if estrategia == "consecutivos":
+        return [(segmentos[i], segmentos[i+1:i+2]) for i in range(0, len(segmentos), 2)]
+    if estrategia == "janela":
+        return [(segmentos[i], segmentos[i+1:i+1+janela]) for i in range(len(segmentos) - 1)]
+    raise ValueError(f"Estratégia de pareamento desconhecida: {estrategia}")
+
+def montar_bloco(data, mae_id, entrada, re_ent, ctx_ent, saidas, re_sai, ctx_sai, alnulu=None):
+    bloco, last_idx = create_entrada_block(data, mae_id, entrada, re_ent, ctx_ent, alnulu)
+    data["maes"][mae_id]["blocos"].append(bloco)
+    for seg in saidas:
+        last_idx = add_saida_to_block(data, mae_id, bloco, last_idx, seg, re_sai, ctx_sai)
+    return bloco
+
+def montar_blocos_em_lote(data, mae_id, pares, re_ent, ctx_ent, re_sai, ctx_sai):
+    # Mesmos tokens que o caminho bloco a bloco: as faixas saem do contador da
+    # mãe em sequência, sem nenhuma varredura dos blocos existentes
+    alnulus = calcular_alnulu_lote([entrada for entrada, _ in pares])
+    return [
+        montar_bloco(data, mae_id, entrada, re_ent, ctx_ent, saidas, re_sai, ctx_sai, alnulu)
+        for (entrada, saidas), alnulu in zip(pares, alnulus)
+    ]
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Ingestão em fluxo (uploads grandes)
+# ────────────────────────────────────────────────────────────────────────────────
+def tokenizar_fluxo(pedacos, saida=None):
+    # Decodifica e conta as unidades INSEPA pedaço a pedaço. Sequências UTF-8
+    # partidas são seguradas pelo decoder incremental; a última unidade de um
+    # pedaço, se encosta no fim dele, volta para o início do próximo, porque
+    # pode continuar lá. O texto decodificado vai sendo escrito em `saida`.
+    dec    = codecs.getincrementaldecoder("utf-8")()
+    n      = 0
+    alnulu = 0
+    resto  = ""
+
+    def consumir(txt, final):
+        nonlocal n, alnulu, resto
+        if saida is not None:
+            saida.write(txt)
+        alnulu += calcular_alnulu(txt)
+        buf    = resto + txt
+        ultimo = None
+        for ultimo in PADRAO_UNIDADE.finditer(buf):
+            n += 1
+        if not final and ultimo is not None and ultimo.end() == len(buf):
+            n    -= 1
+            resto = buf[ultimo.start():]
+        else:
+            resto = ""
+
+    with perfil.medir("tokenizacao"):
+        for pedaco in pedacos:
+            perfil.contar("bytes_lidos", len(pedaco))
+            consumir(dec.decode(pedaco), False)
+        consumir(dec.decode(b"", final=True), True)
+    return n, alnulu
+
+def ingerir_arquivo(f, tamanho=TAMANHO_PEDACO):
+    # Grava o texto em TEXTOS_DIR enquanto tokeniza e devolve a operação que
+    # registra o texto no inconsciente (sem o conteúdo inline)
+    TEXTOS_DIR.mkdir(exist_ok=True)
+    arquivo = f"{uuid.uuid4().hex}.txt"
+    try:
+        with open(TEXTOS_DIR / arquivo, "w", encoding="utf-8", newline="") as saida:
+            n, alnulu = tokenizar_fluxo(iter(lambda: f.read(tamanho), b""), saida)
+    except BaseException:
+        (TEXTOS_DIR / arquivo).unlink(missing_ok=True)
+        raise
+    return {"op": "add_texto_arquivo", "arquivo": arquivo, "unidades": n, "alnulu": alnulu}
+
+def ler_texto(e, limite=-1):
+    if "texto" in e:
+        return e["texto"] if limite < 0 else e["texto"][:limite]
+    with open(TEXTOS_DIR / e["arquivo"], encoding="utf-8", newline="") as f:
+        return f.read(limite)
+
+def descartar_arquivo(arquivo):
+    if arquivo:
+        (TEXTOS_DIR / arquivo).unlink(missing_ok=True)
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Operações sobre o subconsciente (aplicadas ao vivo e no replay do diário)
+# ────────────────────────────────────────────────────────────────────────────────
+def verificar_ids(data):
+    # Completa os contadores de ids que arquivos antigos não tinham
+    reparos = []
+    maes = data["maes"]
+    if "proximo_mae" not in data:
+        data["proximo_mae"] = max(map(int, maes.keys()), default=-1) + 1
+        reparos.append("proximo_mae")
+    if not maes:
+        nova_mae(data, "Interações")
+        reparos.append("mae padrão")
+    for mid, mae in maes.items():
+        ids = [b["bloco_id"] for b in mae["blocos"]]
+        if any(a >= b for a, b in zip(ids, ids[1:])):
+            mae["blocos"].sort(key=lambda b: b["bloco_id"])
+            reparos.append(f"ordem dos blocos da mãe {mid}")
+        if "proximo_bloco" not in mae:
+            mae["proximo_bloco"] = max(ids, default=0) + 1
+            reparos.append(f"proximo_bloco da mãe {mid}")
+    return reparos
+
+def verificar_prefixos(maes_dict):
+    # Renumerações antigas de mães deixaram tokens com o prefixo da posição
+    # anterior; corrige para o id atual da mãe dona do bloco
+    reparadas = set()
+    for mid, mae in maes_dict.items():
+        for bloco in mae["blocos"]:
+            for parte in [bloco["entrada"]] + bloco.get("saidas", []):
+                for toks in parte["tokens"].values():
+                    for faixa in toks.faixas:
+                        if faixa[0] != mid:
+                            faixa[0] = mid
+                            reparadas.add(mid)
+                if parte.get("fim") and not parte["fim"].startswith(f"{mid}."):
+                    parte["fim"] = f"{mid}.{parte['fim'].rsplit('.', 1)[1]}"
+                    reparadas.add(mid)
+    return sorted(reparadas, key=int)
+
+def verificar_hashes(data):
+    # Preenche, numa passada, o hash das entradas gravadas antes de existir;
+    # se a normalização do hash mudou desde a gravação, refaz todos
+    refazer = data.get("hash_versao") != HASH_VERSAO
+    data["hash_versao"] = HASH_VERSAO
+    reparadas = set()
+    for mid, mae in data["maes"].items():
+        for bloco in mae["blocos"]:
+            ent = bloco["entrada"]
+            if refazer or "hash" not in ent:
+                ent["hash"] = hash_entrada(ent["texto"], ent["reacao"], ent["contexto"])
+                reparadas.add(mid)
+    return (["versão do hash"] if refazer else []) + sorted(reparadas, key=int)
+
+def normalizar_subcon(data):
+    reparos = verificar_ids(data)
+    reparos += verificar_prefixos(data["maes"])
+    reparos += verificar_ultimo_child(data["maes"])
+    reparos += verificar_hashes(data)
+    return data, bool(reparos)
+
+def decodificar_subcon(data):
+    for mae in data.get("maes", {}).values():
+        for bloco in mae["blocos"]:
+            ent = bloco["entrada"]
+            ent["tokens"] = decodificar_tokens(ent["tokens"])
+            for saida in bloco.get("saidas", []):
+                saida["tokens"] = decodificar_tokens(saida["tokens"])
+    return data
+
+def codificar_subcon(data):
+    # Cópia rasa só do caminho até os tokens, que vão como strings de faixa
+    def bloco_json(bloco):
+        ent = bloco["entrada"]
+        return {
+            **bloco,
+            "entrada": {**ent, "tokens": codificar_tokens(ent["tokens"])},
+            "saidas":  [{**s, "tokens": codificar_tokens(s["tokens"])} for s in bloco.get("saidas", [])]
+        }
+    maes = {mid: {**mae, "blocos": [bloco_json(b) for b in mae["blocos"]]} for mid, mae in data["maes"].items()}
+    return {**data, "maes": maes}
+
+def vista_subcon(data):
+    # Mãe e lista de blocos copiadas; os blocos são os mesmos objetos
+    maes = {mid: {**mae, "blocos": list(mae["blocos"])} for mid, mae in data["maes"].items()}
+    return {**data, "maes": maes}
+
+def aplicar_op(data, op):
+    maes = data["maes"]
+    tipo = op["op"]
+    if tipo == "add_mae":
+        return nova_mae(data, op["nome"])
+    if tipo == "remove_mae":
+        nome = maes.pop(op["mae_id"])["nome"]
+        if not maes:
+            nova_mae(data, "Interações")
+        return nome
+    if tipo == "rename_mae":
+        maes[op["mae_id"]]["nome"] = op["nome"]
+        return None
+    if tipo == "add_bloco":
+        return montar_bloco(
+            data, op["mae_id"], op["entrada"], op["re_ent"], op["ctx_ent"],
+            op["saidas"], op["re_sai"], op["ctx_sai"]
+        )
+    if tipo == "add_blocos":
+        return montar_blocos_em_lote(
+            data, op["mae_id"], op["pares"], op["re_ent"], op["ctx_ent"],
+            op["re_sai"], op["ctx_sai"]
+        )
+    if tipo == "update_bloco":
+        blocos = maes[op["mae_id"]]["blocos"]
+        bloco  = blocos[posicao_bloco(blocos, op["bloco_id"])]
+        bloco[op["parte"]][op["chave"]] = op["valor"]
+        if op["parte"] == "entrada":
+            ent = bloco["entrada"]
+            ent["hash"] = hash_entrada(ent["texto"], ent["reacao"], ent["contexto"])
+        return None
+    if tipo == "remove_blocos":
+        blocos = maes[op["mae_id"]]["blocos"]
+        ini = bisect.bisect_left(blocos, op["inicio"], key=lambda b: b["bloco_id"])
+        fim = bisect.bisect_right(blocos, op["fim"], key=lambda b: b["bloco_id"])
+        del blocos[ini:fim]
+        return None
+    raise ValueError(f"Operação desconhecida: {tipo}")
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Operações sobre o inconsciente
+# ────────────────────────────────────────────────────────────────────────────────
+# Cada texto tem um "id" fixo, que é o prefixo dos seus tokens; a posição na
+# lista é só o número exibido. Remover um texto não renumera os demais.
+def normalizar_inconsc(data):
+    sujo = False
+    if isinstance(data, list):
+        # Formato antigo: lista solta, numerada pela posição
+        data = {"textos": data}
+        sujo = True
+    textos = data["textos"]
+    for i, e in enumerate(textos):
+        if isinstance(e, str):
+            textos[i] = insepa_tokenizar_texto(str(i+1), e)
+            sujo = True
+        if "id" not in textos[i]:
+            textos[i]["id"] = i + 1
+            sujo = True
+    if "proximo_id" not in data:
+        data["proximo_id"] = max((e["id"] for e in textos), default=0) + 1
+        sujo = True
+    return data, sujo
+
+def decodificar_inconsc(data):
+    # O formato antigo (lista solta, com textos puros) é tratado em normalizar_inconsc
+    for e in data["textos"] if isinstance(data, dict) else data:
+        if isinstance(e, dict) and "tokens" in e:
+            e["tokens"] = decodificar_tokens(e["tokens"])
+    return data
+
+def codificar_inconsc(data):
+    return {**data, "textos": [{**e, "tokens": codificar_tokens(e["tokens"])} for e in data["textos"]]}
+
+def vista_inconsc(data):
+    # edit_texto troca o registro inteiro na lista, então basta copiar a lista
+    return {**data, "textos": list(data["textos"])}
+
+def posicao_texto(textos, text_id):
+    # Os ids crescem na ordem de inserção, então a lista fica ordenada por id
+    pos = bisect.bisect_left(textos, text_id, key=lambda e: e["id"])
+    if pos == len(textos) or textos[pos]["id"] != text_id:
+        raise KeyError(f"Texto {text_id} não encontrado")
+    return pos
+
+def aplicar_op_inconsc(data, op):
+    textos = data["textos"]
+    tipo   = op["op"]
+    if tipo == "add_texto":
+        text_id = data["proximo_id"]
+        data["proximo_id"] += 1
+        e = insepa_tokenizar_texto(str(text_id), op["texto"])
+        e["id"] = text_id
+        textos.append(e)
+        return text_id
+    if tipo == "add_texto_arquivo":
+        text_id = data["proximo_id"]
+        data["proximo_id"] += 1
+        e = registro_texto(str(text_id), op["unidades"], op["alnulu"], arquivo=op["arquivo"])
+        e["id"] = text_id
+        textos.append(e)
+        return text_id
+    # Edição e remoção devolvem o arquivo que deixou de ser usado; ele só é
+    # apagado em finalizar_op_inconsc, depois que a operação foi gravada
+    if tipo == "edit_texto":
+        e = insepa_tokenizar_texto(str(op["id"]), op["texto"])
+        e["id"] = op["id"]
+        pos = posicao_texto(textos, op["id"])
+        antigo = textos[pos].get("arquivo")
+        textos[pos] = e
+        return antigo
+    if tipo == "remove_texto":
+        pos = posicao_texto(textos, op["id"])
+        antigo = textos[pos].get("arquivo")
+        del textos[pos]
+        return antigo
+    raise ValueError(f"Operação desconhecida: {tipo}")
+
+def finalizar_op_inconsc(op, resultado, gravada):
+    if gravada and op["op"] in ("edit_texto", "remove_texto"):
+        descartar_arquivo(resultado)
+    elif not gravada and op["op"] == "add_texto_arquivo":
+        descartar_arquivo(op["arquivo"])  # upload que não chegou a ser registrado
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Índice invertido (token → bloco, palavra → blocos)
+# ────────────────────────────────────────────────────────────────────────────────
+PADRAO_PALAVRA = re.compile(r'\w+', re.UNICODE)
+
+def normalizar_palavra(palavra):
+    decomposta = unicodedata.normalize("NFKD", palavra.casefold())
+    return "".join(c for c in decomposta if not unicodedata.combining(c))
+
+def palavras_de(texto):
+    return {normalizar_palavra(p) for p in PADRAO_PALAVRA.findall(texto)}
+
+def partes_do_bloco(bloco):
+    yield "entrada", bloco["entrada"]
+    for i, saida in enumerate(bloco.get("saidas", []), 1):
+        yield f"saida {i}", saida
+
+class IndiceInsepa:
+    # Por mãe, as faixas de tokens de cada parte de bloco ficam em listas
+    # paralelas ordenadas pelo início (a alocação é crescente, então quase
+    # sempre é um append) e a busca de um token é um bisect. As palavras das
+    # entradas apontam para os blocos que as contêm.
+    def __init__(self, path: Path):
+        self.path     = path
+        self.faixas   = {}
+        self.palavras = {}
+
+    # ── consulta ──
+    def localizar_token(self, token):
+        mae_id, idx = token.strip().rsplit(".", 1)
+        fx = self.faixas.get(mae_id)
+        idx = int(idx)
+        if not fx:
+            return None
+        pos = bisect.bisect_right(fx["inicios"], idx) - 1
+        if pos < 0 or idx > fx["fins"][pos]:
+            return None
+        bloco_id, parte = fx["refs"][pos]
+        return mae_id, bloco_id, parte
+
+    def buscar_palavra(self, palavra):
+        refs = self.palavras.get(normalizar_palavra(palavra.strip()), ())
+        return sorted(refs, key=lambda r: (int(r[0]), r[1]))
+
+    # ── manutenção ──
+    def _faixas_da_mae(self, mae_id):
+        return self.faixas.setdefault(mae_id, {"inicios": [], "fins": [], "refs": []})
+
+    def adicionar_bloco(self, mae_id, bloco):
+        fx = self._faixas_da_mae(mae_id)
+        for parte, conteudo in partes_do_bloco(bloco):
+            for _, inicio, qtd in conteudo["tokens"]["TOTAL"].faixas:
+                pos = bisect.bisect_left(fx["inicios"], inicio)
+                fx["inicios"].insert(pos, inicio)
+                fx["fins"].insert(pos, inicio + qtd - 1)
+                fx["refs"].insert(pos, (bloco["bloco_id"], parte))
+        self._indexar_palavras(mae_id, bloco["bloco_id"], bloco["entrada"]["texto"])
+
+    def remover_bloco(self, mae_id, bloco):
+        fx = self._faixas_da_mae(mae_id)
+        for _, conteudo in partes_do_bloco(bloco):
+            for _, inicio, _ in conteudo["tokens"]["TOTAL"].faixas:
+                pos = bisect.bisect_left(fx["inicios"], inicio)
+                if pos < len(fx["inicios"]) and fx["inicios"][pos] == inicio:
+                    del fx["inicios"][pos], fx["fins"][pos], fx["refs"][pos]
+        self._desindexar_palavras(mae_id, bloco["bloco_id"], bloco["entrada"]["texto"])
+
+    def _indexar_palavras(self, mae_id, bloco_id, texto):
+        for p in palavras_de(texto):
+            self.palavras.setdefault(p, set()).add((mae_id, bloco_id))
+
+    def _desindexar_palavras(self, mae_id, bloco_id, texto):
+        for p in palavras_de(texto):
+            refs = self.palavras.get(p)
+            if refs:
+                refs.discard((mae_id, bloco_id))
+                if not refs:
+                    del self.palavras[p]
+
+    def reconstruir(self, data):
+        self.faixas, self.palavras = {}, {}
+        for mae_id, mae in data["maes"].items():
+            for bloco in mae["blocos"]:
+                self.adicionar_bloco(mae_id, bloco)
+
+    # ── ganchos do Diario ──
+    def preparar(self, data, op):
+        return op
+
+    def antes_op(self, data, op):
+        tipo = op["op"]
+        if tipo == "remove_mae":
+            for bloco in data["maes"][op["mae_id"]]["blocos"]:
+                self._desindexar_palavras(op["mae_id"], bloco["bloco_id"], bloco["entrada"]["texto"])
+            self.faixas.pop(op["mae_id"], None)
+        elif tipo == "update_bloco" and (op["parte"], op["chave"]) == ("entrada", "texto"):
+            blocos = data["maes"][op["mae_id"]]["blocos"]
+            bloco  = blocos[posicao_bloco(blocos, op["bloco_id"])]
+            self._desindexar_palavras(op["mae_id"], bloco["bloco_id"], bloco["entrada"]["texto"])
+        elif tipo == "remove_blocos":
+            blocos = data["maes"][op["mae_id"]]["blocos"]
+            ini = bisect.bisect_left(blocos, op["inicio"], key=lambda b: b["bloco_id"])
+            fim = bisect.bisect_right(blocos, op["fim"], key=lambda b: b["bloco_id"])
+            for bloco in blocos[ini:fim]:
+                self.remover_bloco(op["mae_id"], bloco)
+
+    def depois_op(self, data, op, resultado):
+        tipo = op["op"]
+        if tipo == "add_bloco":
+            self.adicionar_bloco(op["mae_id"], resultado)
+        elif tipo == "add_blocos":
+            for bloco in resultado:
+                self.adicionar_bloco(op["mae_id"], bloco)
+        elif tipo == "update_bloco" and (op["parte"], op["chave"]) == ("entrada", "texto"):
+            self._indexar_palavras(op["mae_id"], op["bloco_id"], op["valor"])
+
+    # ── persistência (ao lado do snapshot, com a mesma geração) ──
+    def salvar(self, geracao):
+        save_json(self.path, {
+            "geracao":  geracao,
+            "faixas":   {
+                mid: [[i, f, b, p] for i, f, (b, p) in zip(fx["inicios"], fx["fins"], fx["refs"])]
+                for mid, fx in self.faixas.items()
+            },
+            "palavras": {p: [list(r) for r in refs] for p, refs in self.palavras.items()},
+        })
+
+    def carregar(self, geracao):
+        if not self.path.exists():
+            return False
+        salvo = json.loads(self.path.read_text(encoding="utf-8"))
+        if salvo.get("geracao") != geracao:
+            return False
+        self.faixas = {
+            mid: {
+                "inicios": [l[0] for l in linhas],
+                "fins":    [l[1] for l in linhas],
+                "refs":    [(l[2], l[3]) for l in linhas],
+            }
+            for mid, linhas in salvo["faixas"].items()
+        }
+        self.palavras = {p: {tuple(r) for r in refs} for p, refs in salvo["palavras"].items()}
+        return True
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Tabela de hashes entrada → saída
+# ────────────────────────────────────────────────────────────────────────────────
+class TabelaHashes:
+    # Por mãe, hash da entrada → ids dos blocos com essa entrada (mais de um só
+    # em dados antigos, gravados antes da checagem de duplicatas)
+    def __init__(self, path: Path):
+        self.path   = path
+        self.tabela = {}
+
+    def blocos_com(self, mae_id, texto, reacao, contexto):
+        return self.tabela.get(mae_id, {}).get(hash_entrada(texto, reacao, contexto), [])
+
+    def responder(self, data, mae_id, texto, reacao="", contexto=""):
+        # Bloco e saídas de uma entrada conhecida, sem varrer a mãe
+        ids = self.blocos_com(mae_id, texto, reacao, contexto)
+        if not ids:
+            return None
+        blocos = data["maes"][mae_id]["blocos"]
+        bloco  = blocos[posicao_bloco(blocos, ids[0])]
+        return bloco, bloco["saidas"]
+
+    def filtrar_duplicados(self, mae_id, pares, re_ent, ctx_ent):
+        # Descarta pares cuja entrada já existe na mãe ou se repete no lote
+        vistos, novos = set(), []
+        for entrada, saidas in pares:
+            h = hash_entrada(entrada, re_ent, ctx_ent)
+            if h in vistos or h in self.tabela.get(mae_id, {}):
+                continue
+            vistos.add(h)
+            novos.append((entrada, saidas))
+        return novos
+
+    def _adicionar(self, mae_id, bloco):
+        self.tabela.setdefault(mae_id, {}).setdefault(bloco["entrada"]["hash"], []).append(bloco["bloco_id"])
+
+    def _remover(self, mae_id, bloco):
+        hashes = self.tabela.get(mae_id, {})
+        ids = hashes.get(bloco["entrada"]["hash"], [])
+        if bloco["bloco_id"] in ids:
+            ids.remove(bloco["bloco_id"])
+            if not ids:
+                del hashes[bloco["entrada"]["hash"]]
+
+    def reconstruir(self, data):
+        self.tabela = {}
+        for mae_id, mae in data["maes"].items():
+            for bloco in mae["blocos"]:
+                self._adicionar(mae_id, bloco)
+
+    # ── ganchos do Diario ──
+    def preparar(self, data, op):
+        # Checagem definitiva de duplicatas, já com a trava de escrita e os
+        # dados em dia: a feita na interface pode ter visto um estado antigo
+        tipo = op["op"]
+        if tipo == "add_bloco":
+            ids = self.blocos_com(op["mae_id"], op["entrada"], op["re_ent"], op["ctx_ent"])
+            if ids:
+                raise Duplicado(f"A entrada já existe na mãe {op['mae_id']} (bloco id {ids[0]})")
+        elif tipo == "add_blocos":
+            return {**op, "pares": self.filtrar_duplicados(op["mae_id"], op["pares"], op["re_ent"], op["ctx_ent"])}
+        return op
+
+    def antes_op(self, data, op):
+        tipo = op["op"]
+        if tipo == "remove_mae":
+            self.tabela.pop(op["mae_id"], None)
+        elif tipo == "update_bloco" and op["parte"] == "entrada":
+            blocos = data["maes"][op["mae_id"]]["blocos"]
+            self._remover(op["mae_id"], blocos[posicao_bloco(blocos, op["bloco_id"])])
+        elif tipo == "remove_blocos":
+            blocos = data["maes"][op["mae_id"]]["blocos"]
+            ini = bisect.bisect_left(blocos, op["inicio"], key=lambda b: b["bloco_id"])
+            fim = bisect.bisect_right(blocos, op["fim"], key=lambda b: b["bloco_id"])
+            for bloco in blocos[ini:fim]:
+                self._remover(op["mae_id"], bloco)
+
+    def depois_op(self, data, op, resultado):
+        tipo = op["op"]
+        if tipo == "add_bloco":
+            self._adicionar(op["mae_id"], resultado)
+        elif tipo == "add_blocos":
+            for bloco in resultado:
+                self._adicionar(op["mae_id"], bloco)
+        elif tipo == "update_bloco" and op["parte"] == "entrada":
+            blocos = data["maes"][op["mae_id"]]["blocos"]
+            self._adicionar(op["mae_id"], blocos[posicao_bloco(blocos, op["bloco_id"])])
+
+    # ── persistência ──
+    def salvar(self, geracao):
+        save_json(self.path, {"geracao": geracao, "tabela": self.tabela})
+
+    def carregar(self, geracao):
+        if not self.path.exists():
+            return False
+        salvo = json.loads(self.path.read_text(encoding="utf-8"))
+        if salvo.get("geracao") != geracao:
+            return False
+        self.tabela = salvo["tabela"]
+        return True
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Resumos para exibição (calculados sob demanda, descartados quando o item muda)
+# ────────────────────────────────────────────────────────────────────────────────
+def _cortar(texto, limite):
+    texto = " ".join(texto.split())
+    return texto if len(texto) <= limite else texto[:limite] + "..."
+
+def resumir_bloco(bloco):
+    saidas = bloco.get("saidas", [])
+    linha  = f"Entrada: {_cortar(bloco['entrada']['texto'], 80)}"
+    if saidas:
+        primeira = " | ".join(saidas[0]["textos"])
+        linha += f" → {len(saidas)} saída(s): {_cortar(primeira, 60)}"
+    else:
+        linha += " → (nenhuma saída)"
+    return linha
+
+class ResumosBlocos:
+    # Só em memória: não há o que persistir, recalcular é barato por bloco.
+    # resumo() roda nas threads de render, sem a trava do armazenamento, e
+    # calcula fora da trava do cache. A invalidação vem depois da operação
+    # aplicada e sobe `versao`: um resumo calculado durante uma escrita não é
+    # guardado, porque pode ter lido o bloco antes da mudança
+    def __init__(self):
+        self.cache  = {}
+        self.versao = 0
+        self.trava  = threading.Lock()
+
+    def resumo(self, mae_id, bloco):
+        chave = (mae_id, bloco["bloco_id"])
+        with self.trava:
+            if chave in self.cache:
+                return self.cache[chave]
+            versao = self.versao
+        linha = resumir_bloco(bloco)
+        with self.trava:
+            if versao == self.versao:
+                self.cache[chave] = linha
+        return linha
+
+    def reconstruir(self, data):
+        with self.trava:
+            self.cache = {}
+            self.versao += 1
+
+    def preparar(self, data, op):
+        return op
+
+    def antes_op(self, data, op):
+        pass
+
+    def depois_op(self, data, op, resultado):
+        tipo = op["op"]
+        if tipo == "remove_mae":
+            fora = lambda k: k[0] == op["mae_id"]
+        elif tipo == "update_bloco":
+            fora = lambda k: k == (op["mae_id"], op["bloco_id"])
+        elif tipo == "remove_blocos":
+            fora = lambda k: k[0] == op["mae_id"] and op["inicio"] <= k[1] <= op["fim"]
+        else:
+            return
+        with self.trava:
+            for chave in [k for k in self.cache if fora(k)]:
+                del self.cache[chave]
+            self.versao += 1
+
+    def salvar(self, geracao):
+        pass
+
+    def carregar(self, geracao):
+        return False
+
+class PreviasTextos:
+    # Prévia dos textos do inconsciente; evita reabrir os arquivos de uploads
+    # grandes a cada rerun. edit_texto troca o registro inteiro, então cada
+    # prévia fica guardada junto do registro de onde saiu: uma vista antiga
+    # nunca recebe a prévia do texto novo, nem o contrário
+    def __init__(self, limite=100):
+        self.limite = limite
+        self.cache  = {}
+        self.trava  = threading.Lock()
+
+    def previa(self, e):
+        with self.trava:
+            registro, texto = self.cache.get(e["id"], (None, None))
+        if registro is not e:
+            texto = _cortar(ler_texto(e, self.limite * 2), self.limite)
+            with self.trava:
+                self.cache[e["id"]] = (e, texto)
+        return texto
+
+    def reconstruir(self, data):
+        with self.trava:
+            self.cache = {}
+
+    def preparar(self, data, op):
+        return op
+
+    def antes_op(self, data, op):
+        pass
+
+    def depois_op(self, data, op, resultado):
+        if op["op"] in ("edit_texto", "remove_texto"):
+            with self.trava:
+                self.cache.pop(op["id"], None)
+
+    def salvar(self, geracao):
+        pass
+
+    def carregar(self, geracao):
+        return False
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Backend SQLite
+# ────────────────────────────────────────────────────────────────────────────────
+class ArmazenamentoSQLite(Armazenamento):
+    # Mesmo modelo em memória do backend JSON, mas cada operação vira só as
+    # linhas que ela muda, numa transação. PRAGMA data_version diz se outra
+    # conexão gravou desde a última leitura: registrar() confere isso já com
+    # a trava de escrita (BEGIN IMMEDIATE) e alcança antes de aplicar.
+    #
+    # Para alcançar sem reler o banco inteiro, cada transação também anexa a
+    # operação em `operacoes`, como no diário do backend JSON: as outras
+    # conexões reaplicam o que veio depois do seu `seq`. Só relê tudo quem
+    # ficou para trás das operações já podadas ou quando o banco foi regravado
+    # inteiro (a "geracao" em meta muda).
+    ESQUEMA = ""
+    OPERACOES = """
+    CREATE TABLE IF NOT EXISTS operacoes (seq INTEGER PRIMARY KEY AUTOINCREMENT, op TEXT NOT NULL);
+    """
+
+    def __init__(self, banco: Path, aplicar, normalizar=None, derivados=None, finalizar=None,
+                 copiar=None, limite=DIARIO_LIMITE_OPS):
+        self.banco      = banco
+        self.aplicar    = aplicar
+        self.finalizar  = finalizar
+        self.copiar     = copiar
+        self.normalizar = normalizar
+        self.derivados  = derivados or {}
+        self.limite     = limite
+        self.data       = None
+        self.assinatura = None
+        self.geracao    = None
+        self.seq        = 0
+        self.versao     = 0
+        self.trava      = threading.RLock()
+        self.con = sqlite3.connect(banco, check_same_thread=False, isolation_level=None)
+        self.con.execute("PRAGMA foreign_keys = ON")
+        self.con.execute("PRAGMA journal_mode = WAL")
+        self.con.executescript(self.ESQUEMA + self.OPERACOES)
+
+    def _transacao(self, func, *args):
+        self.con.execute("BEGIN IMMEDIATE")
+        try:
+            func(*args)
+        except BaseException:
+            self.con.execute("ROLLBACK")
+            raise
+        self.con.execute("COMMIT")
+
+    @contextmanager
+    def _leitura(self):
+        # Várias consultas vendo o mesmo estado do banco; dentro de uma
+        # transação de escrita já é assim
+        if self.con.in_transaction:
+            yield
+            return
+        self.con.execute("BEGIN")
+        try:
+            yield
+        finally:
+            self.con.execute("COMMIT")
+
+    def _data_version(self):
+        return self.con.execute("PRAGMA data_version").fetchone()[0]
+
+    def _ultimo_seq(self):
+        linha = self.con.execute("SELECT seq FROM sqlite_sequence WHERE name = 'operacoes'").fetchone()
+        return linha[0] if linha else 0
+
+    def _meta(self, chave, valor=None):
+        if valor is None:
+            linha = self.con.execute("SELECT valor FROM meta WHERE chave = ?", (chave,)).fetchone()
+            return linha and json.loads(linha[0])
+        self.con.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (chave, json.dumps(valor)))
+
+    def obter(self):
+        with self.trava:
+            if self.data is None or self._data_version() != self.assinatura:
+                self._sincronizar()
+            return self.data
+
+    def carregar(self):
+        with perfil.medir("sqlite_leitura"), _sem_gc(), self._leitura():
+            self.assinatura = self._data_version()
+            self.geracao    = self._meta("geracao")
+            self.seq        = self._ultimo_seq()
+            self.data       = self._ler()
+        sujo = False
+        if self.normalizar:
+            self.data, sujo = self.normalizar(self.data)
+        if sujo and self.con.in_transaction:
+            self._regravar(self.data)
+        elif sujo:
+            self._transacao(self._regravar, self.data)
+        with perfil.medir("indices"):
+            for d in self.derivados.values():
+                d.reconstruir(self.data)
+        self.versao += 1
+        return self.data
+
+    def _sincronizar(self):
+        # Reaplica as operações que outras conexões gravaram desde `seq`
+        try:
+            with self._leitura():
+                assinatura = self._data_version()
+                geracao    = self._meta("geracao")
+                ops = self.con.execute("SELECT seq, op FROM operacoes WHERE seq > ? ORDER BY seq",
+                                       (self.seq,)).fetchall()
+            if self.data is None or geracao != self.geracao or (ops and ops[0][0] != self.seq + 1):
+                self.carregar()
+                return
+            with perfil.medir("sincronizar"):
+                for seq, op in ops:
+                    self._aplicar(json.loads(op))
+                    self.seq = seq
+                    self.versao += 1
+            self.assinatura = assinatura
+        except BaseException:
+            self.data = None  # replay interrompido: dados e derivados pela metade
+            raise
+
+    def _anotar(self, op):
+        # Poda de tempos em tempos: quem ficou mais de `limite` operações para
+        # trás relê tudo
+        self.seq = self.con.execute("INSERT INTO operacoes (op) VALUES (?)",
+                                    (json.dumps(op, ensure_ascii=False),)).lastrowid
+        if self.seq % self.limite == 0:
+            self.con.execute("DELETE FROM operacoes WHERE seq <= ?", (self.seq - self.limite,))
+
+    def _regravar(self, data):
+        self._gravar_tudo(data)
+        self.con.execute("DELETE FROM operacoes")
+        self.geracao = (self._meta("geracao") or 0) + 1
+        self._meta("geracao", self.geracao)
+
+    def registrar(self, op):
+        with self.trava:
+            self.con.execute("BEGIN IMMEDIATE")
+            aplicada = False
+            try:
+                if self.data is None or self._data_version() != self.assinatura:
+                    self._sincronizar()
+                op = self._preparar(op)  # recusa antes de mexer nos dados
+                aplicada = True
+                resultado = self._aplicar(op)
+                with perfil.medir("sqlite_escrita"):
+                    self._persistir(op, resultado)
+                    self._anotar(op)
+                self.con.execute("COMMIT")
+            except BaseException:
+                if self.con.in_transaction:
+                    self.con.execute("ROLLBACK")
+                if aplicada:
+                    self.data = None  # memória divergiu do banco: relê
+                self._finalizar(op, None, False)
+                raise
+            self.versao += 1
+            self._finalizar(op, resultado, True)
+            return resultado
+
+    def substituir(self, data):
+        with self.trava:
+            self._transacao(self._regravar, data)
+            self.data = data
+            with perfil.medir("indices"):
+                for d in self.derivados.values():
+                    d.reconstruir(self.data)
+            self.assinatura = self._data_version()
+            self.seq = self._ultimo_seq()
+            self.versao += 1
+
+    def compactar(self):
+        self.con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+def _faixa_total(tokens):
+    fx = tokens["TOTAL"].faixas
+    return (fx[0][1], tokens["TOTAL"].ultimo_indice()) if fx else (None, None)
+
+def _tokens_json(tokens):
+    return json.dumps(codificar_tokens(tokens), ensure_ascii=False, separators=(",", ":"))
+
+class SubconSQLite(ArmazenamentoSQLite):
+    ESQUEMA = """
+    CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT);
+    CREATE TABLE IF NOT EXISTS maes (
+        mae_id        INTEGER PRIMARY KEY,
+        nome          TEXT NOT NULL,
+        ultimo_child  TEXT NOT NULL,
+        proximo_bloco INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS blocos (
+        mae_id     INTEGER NOT NULL REFERENCES maes ON DELETE CASCADE,
+        bloco_id   INTEGER NOT NULL,
+        texto      TEXT, reacao TEXT, contexto TEXT,
+        tokens     TEXT, fim TEXT, alnulu INTEGER, hash TEXT,
+        aberto     INTEGER,
+        tok_inicio INTEGER, tok_fim INTEGER,
+        PRIMARY KEY (mae_id, bloco_id)
+    );
+    CREATE TABLE IF NOT EXISTS saidas (
+        mae_id     INTEGER NOT NULL,
+        bloco_id   INTEGER NOT NULL,
+        ordem      INTEGER NOT NULL,
+        textos     TEXT, reacao TEXT, contexto TEXT,
+        tokens     TEXT, fim TEXT,
+        tok_inicio INTEGER, tok_fim INTEGER,
+        PRIMARY KEY (mae_id, bloco_id, ordem),
+        FOREIGN KEY (mae_id, bloco_id) REFERENCES blocos ON DELETE CASCADE
+    );
+    CREATE INDEX IF NOT EXISTS blocos_tokens ON blocos (mae_id, tok_inicio);
+    CREATE INDEX IF NOT EXISTS saidas_tokens ON saidas (mae_id, tok_inicio);
+    CREATE INDEX IF NOT EXISTS blocos_hash   ON blocos (mae_id, hash);
+    """
+
+    def _ler(self):
+        data = {"maes": {}}
+        for mid, nome, ultimo, prox in self.con.execute(
+                "SELECT mae_id, nome, ultimo_child, proximo_bloco FROM maes ORDER BY mae_id"):
+            data["maes"][str(mid)] = {"nome": nome, "ultimo_child": ultimo, "proximo_bloco": prox, "blocos": []}
+        por_id = {}
+        for mid, bid, texto, reacao, contexto, tokens, fim, alnulu, h, aberto in self.con.execute(
+                "SELECT mae_id, bloco_id, texto, reacao, contexto, tokens, fim, alnulu, hash, aberto"
+                " FROM blocos ORDER BY mae_id, bloco_id"):
+            bloco = {
+                "bloco_id": bid,
+                "entrada": {
+                    "texto": texto, "reacao": reacao, "contexto": contexto,
+                    "tokens": decodificar_tokens(json.loads(tokens)),
+                    "fim": fim, "alnulu": alnulu, "hash": h
+                },
+                "saidas": [],
+                "open": bool(aberto)
+            }
+            data["maes"][str(mid)]["blocos"].append(bloco)
+            por_id[(mid, bid)] = bloco
+        for mid, bid, textos, reacao, contexto, tokens, fim in self.con.execute(
+                "SELECT mae_id, bloco_id, textos, reacao, contexto, tokens, fim"
+                " FROM saidas ORDER BY mae_id, bloco_id, ordem"):
+            por_id[(mid, bid)]["saidas"].append({
+                "textos": json.loads(textos), "reacao": reacao, "contexto": contexto,
+                "tokens": decodificar_tokens(json.loads(tokens)), "fim": fim
+            })
+        for chave in ("proximo_mae", "hash_versao"):
+            valor = self._meta(chave)
+            if valor is not None:
+                data[chave] = valor
+        return data
+
+    def _gravar_mae(self, mid, mae, substituir=True):
+        # Nunca INSERT OR REPLACE: o REPLACE apaga a linha e leva os blocos no cascade
+        self.con.execute(
+            "INSERT INTO maes (mae_id, nome, ultimo_child, proximo_bloco) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (mae_id) DO "
+            + ("UPDATE SET nome = excluded.nome, ultimo_child = excluded.ultimo_child,"
+               " proximo_bloco = excluded.proximo_bloco" if substituir else "NOTHING"),
+            (int(mid), mae["nome"], mae["ultimo_child"], mae["proximo_bloco"])
+        )
+
+    def _gravar_contadores(self, mid, mae):
+        self.con.execute(
+            "UPDATE maes SET ultimo_child = ?, proximo_bloco = ? WHERE mae_id = ?",
+            (mae["ultimo_child"], mae["proximo_bloco"], int(mid))
+        )
+
+    def _gravar_bloco(self, mid, bloco):
+        ent = bloco["entrada"]
+        self.con.execute(
+            "INSERT INTO blocos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (mae_id, bloco_id) DO UPDATE SET texto = excluded.texto,"
+            " reacao = excluded.reacao, contexto = excluded.contexto, tokens = excluded.tokens,"
+            " fim = excluded.fim, alnulu = excluded.alnulu, hash = excluded.hash,"
+            " aberto = excluded.aberto, tok_inicio = excluded.tok_inicio, tok_fim = excluded.tok_fim",
+            (int(mid), bloco["bloco_id"], ent["texto"], ent["reacao"], ent["contexto"],
+             _tokens_json(ent["tokens"]), ent["fim"], ent["alnulu"], ent.get("hash"),
+             int(bloco.get("open", True)), *_faixa_total(ent["tokens"]))
+        )
+        self.con.execute("DELETE FROM saidas WHERE mae_id = ? AND bloco_id = ?", (int(mid), bloco["bloco_id"]))
+        self.con.executemany(
+            "INSERT INTO saidas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(int(mid), bloco["bloco_id"], i, json.dumps(s["textos"], ensure_ascii=False),
+              s["reacao"], s["contexto"], _tokens_json(s["tokens"]), s["fim"],
+              *_faixa_total(s["tokens"]))
+             for i, s in enumerate(bloco["saidas"])]
+        )
+
+    def _gravar_tudo(self, data):
+        self.con.execute("DELETE FROM maes")
+        self._meta("proximo_mae", data["proximo_mae"])
+        self._meta("hash_versao", data["hash_versao"])
+        for mid, mae in data["maes"].items():
+            self._gravar_mae(mid, mae)
+            for bloco in mae["blocos"]:
+                self._gravar_bloco(mid, bloco)
+
+    def _persistir(self, op, resultado):
+        maes = self.data["maes"]
+        tipo = op["op"]
+        if tipo == "add_mae":
+            self._gravar_mae(resultado, maes[resultado])
+            self._meta("proximo_mae", self.data["proximo_mae"])
+        elif tipo == "remove_mae":
+            self.con.execute("DELETE FROM maes WHERE mae_id = ?", (int(op["mae_id"]),))
+            if len(maes) == 1:  # pode ser a mãe padrão, recriada quando não sobra nenhuma
+                mid, mae = next(iter(maes.items()))
+                self._gravar_mae(mid, mae, substituir=False)
+            self._meta("proximo_mae", self.data["proximo_mae"])
+        elif tipo == "rename_mae":
+            self.con.execute("UPDATE maes SET nome = ? WHERE mae_id = ?", (op["nome"], int(op["mae_id"])))
+        elif tipo in ("add_bloco", "add_blocos"):
+            for bloco in ([resultado] if tipo == "add_bloco" else resultado):
+                self._gravar_bloco(op["mae_id"], bloco)
+            self._gravar_contadores(op["mae_id"], maes[op["mae_id"]])
+        elif tipo == "update_bloco":
+            blocos = maes[op["mae_id"]]["blocos"]
+            bloco  = blocos[posicao_bloco(blocos, op["bloco_id"])]
+            if op["parte"] == "entrada" and op["chave"] in ("texto", "reacao", "contexto"):
+                self.con.execute(
+                    f"UPDATE blocos SET {op['chave']} = ?, hash = ? WHERE mae_id = ? AND bloco_id = ?",
+                    (op["valor"], bloco["entrada"]["hash"], int(op["mae_id"]), op["bloco_id"])
+                )
+            else:
+                self._gravar_bloco(op["mae_id"], bloco)
+        elif tipo == "remove_blocos":
+            self.con.execute(
+                "DELETE FROM blocos WHERE mae_id = ? AND bloco_id BETWEEN ? AND ?",
+                (int(op["mae_id"]), op["inicio"], op["fim"])
+            )
+        else:
+            raise ValueError(f"Operação desconhecida: {tipo}")
+
+class InconscSQLite(ArmazenamentoSQLite):
+    ESQUEMA = """
+    CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT);
+    CREATE TABLE IF NOT EXISTS textos (
+        id           INTEGER PRIMARY KEY,
+        nome         TEXT, texto TEXT, arquivo TEXT,
+        tokens       TEXT, ultimo_child TEXT, fim TEXT, alnulu INTEGER
+    );
+    """
+
+    def _ler(self):
+        textos = []
+        for tid, nome, texto, arquivo, tokens, ultimo, fim, alnulu in self.con.execute(
+                "SELECT id, nome, texto, arquivo, tokens, ultimo_child, fim, alnulu"
+                " FROM textos ORDER BY id"):
+            e = {"nome": nome}
+            e.update({"texto": texto} if arquivo is None else {"arquivo": arquivo})
+            e.update({
+                "tokens": decodificar_tokens(json.loads(tokens)),
+                "ultimo_child": ultimo, "fim": fim, "alnulu": alnulu, "id": tid
+            })
+            textos.append(e)
+        data = {"textos": textos}
+        proximo = self._meta("proximo_id")
+        if proximo is not None:
+            data["proximo_id"] = proximo
+        return data
+
+    def _gravar_texto(self, e):
+        self.con.execute(
+            "INSERT OR REPLACE INTO textos VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (e["id"], e["nome"], e.get("texto"), e.get("arquivo"), _tokens_json(e["tokens"]),
+             e["ultimo_child"], e["fim"], e["alnulu"])
+        )
+
+    def _gravar_tudo(self, data):
+        self.con.execute("DELETE FROM textos")
+        self._meta("proximo_id", data["proximo_id"])
+        for e in data["textos"]:
+            self._gravar_texto(e)
+
+    def _persistir(self, op, resultado):
+        textos = self.data["textos"]
+        tipo   = op["op"]
+        if tipo in ("add_texto", "add_texto_arquivo"):
+            self._gravar_texto(textos[posicao_texto(textos, resultado)])
+            self._meta("proximo_id", self.data["proximo_id"])
+        elif tipo == "edit_texto":
+            self._gravar_texto(textos[posicao_texto(textos, op["id"])])
+        elif tipo == "remove_texto":
+            self.con.execute("DELETE FROM textos WHERE id = ?", (op["id"],))
+        else:
+            raise ValueError(f"Operação desconhecida: {tipo}")
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Abertura dos armazenamentos
+# ────────────────────────────────────────────────────────────────────────────────
+def abrir_subcon(snapshot: Path = SUB_FILE, diario: Path = SUB_DIARIO, backend=None, banco: Path = SUB_DB):
+    derivados = {
+        "indice":  IndiceInsepa(snapshot.with_suffix(".indice.json")),
+        "hashes":  TabelaHashes(snapshot.with_suffix(".hashes.json")),
+        "resumos": ResumosBlocos(),
+    }
+    if (backend or BACKEND) == "sqlite":
+        return SubconSQLite(banco, aplicar_op, normalizar_subcon, derivados, copiar=vista_subcon)
+    return Diario(
+        snapshot, diario,
+        {"maes": {"0": {"nome": "Interações", "ultimo_child": "0.0", "proximo_bloco": 1, "blocos": []}},
+         "proximo_mae": 1, "hash_versao": HASH_VERSAO},
+        aplicar_op, normalizar_subcon,
+        derivados=derivados, copiar=vista_subcon,
+        codificar=codificar_subcon, decodificar=decodificar_subcon
+    )
+
+def abrir_inconsc(snapshot: Path = INC_FILE, diario: Path = INC_DIARIO, backend=None, banco: Path = INC_DB):
+    derivados = {"previas": PreviasTextos()}
+    if (backend or BACKEND) == "sqlite":
+        return InconscSQLite(banco, aplicar_op_inconsc, normalizar_inconsc, derivados,
+                             finalizar_op_inconsc, vista_inconsc)
+    return Diario(
+        snapshot, diario,
+        {"textos": [], "proximo_id": 1},
+        aplicar_op_inconsc, normalizar_inconsc,
+        derivados=derivados, finalizar=finalizar_op_inconsc, copiar=vista_inconsc,
+        codificar=codificar_inconsc, decodificar=decodificar_inconsc
+    )
+
+def migrar(origem: Armazenamento, destino: Armazenamento):
+    # Copia o conteúdo completo de um backend para outro
+    destino.substituir(copy.deepcopy(origem.obter()))
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Linha de comando (processamento em lote, sem Streamlit)
+# ────────────────────────────────────────────────────────────────────────────────
+def processar_diretorio(diario, mae_id, pasta: Path, estrategia="consecutivos", janela=1,
+                        re_ent="", ctx_ent="", re_sai="", ctx_sai=""):
+    # Um único registro no diário por arquivo, com todos os blocos do texto
+    data = diario.obter()
+    if mae_id not in data["maes"]:
+        raise KeyError(f"Mãe {mae_id} não encontrada")
+    total = 0
+    for arq in sorted(pasta.glob("*.txt")):
+        pares = parear_segmentos(segment_text(arq.read_text(encoding="utf-8")), estrategia, janela)
+        pares = diario.derivados["hashes"].filtrar_duplicados(mae_id, pares, re_ent, ctx_ent)
+        if not pares:
+            continue
+        # O filtro é refeito sob a trava; conta o que foi de fato gravado
+        total += len(diario.registrar({
+            "op": "add_blocos", "mae_id": mae_id, "pares": pares,
+            "re_ent": re_ent, "ctx_ent": ctx_ent, "re_sai": re_sai, "ctx_sai": ctx_sai
+        }))
+    return total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ferramentas INSEPA sem interface")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    proc = sub.add_parser("processar", help="transforma uma pasta de .txt em blocos de uma mãe")
+    proc.add_argument("pasta", type=Path)
+    proc.add_argument("--mae", required=True, help="id da mãe que recebe os blocos")
+    proc.add_argument("--estrategia", choices=ESTRATEGIAS_PAREAMENTO, default="consecutivos")
+    proc.add_argument("--janela", type=int, default=1, help="saídas por entrada na estratégia 'janela'")
+    proc.add_argument("--reacao-entrada", default="")
+    proc.add_argument("--contexto-entrada", default="")
+    proc.add_argument("--reacao-saida", default="")
+    proc.add_argument("--contexto-saida", default="")
+    proc.add_argument("--memoria", type=Path, default=SUB_FILE, help="snapshot do subconsciente")
+
+    mig = sub.add_parser("migrar", help="copia subconsciente e inconsciente entre backends")
+    mig.add_argument("--de", choices=("json", "sqlite"), required=True)
+    mig.add_argument("--para", choices=("json", "sqlite"), required=True)
+    mig.add_argument("--banco", type=Path, default=SUB_DB, help="banco SQLite do subconsciente")
+    mig.add_argument("--banco-inconsciente", type=Path, default=INC_DB, help="banco SQLite do inconsciente")
+
+    args = parser.parse_args(argv)
+    if args.comando == "processar":
+        diario = abrir_subcon(args.memoria, args.memoria.with_suffix(".journal.jsonl"))
+        total = processar_diretorio(
+            diario, args.mae, args.pasta, args.estrategia, args.janela,
+            args.reacao_entrada, args.contexto_entrada,
+            args.reacao_saida, args.contexto_saida
+        )
+        diario.compactar()
+        print(f"{total} bloco(s) criados na mãe {args.mae}")
+    elif args.comando == "migrar":
+        if args.de == args.para:
+            parser.error("origem e destino são o mesmo backend")
+        for abrir, banco in ((abrir_subcon, args.banco), (abrir_inconsc, args.banco_inconsciente)):
+            migrar(abrir(backend=args.de, banco=banco), abrir(backend=args.para, banco=banco))
+        print(f"Dados copiados de {args.de} para {args.para}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
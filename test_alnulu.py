@@ -0,0 +1,56 @@
+import pytest
+
+import insepa
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Referência congelada: calcular_alnulu antes da tabela pré-calculada
+# ────────────────────────────────────────────────────────────────────────────────
+def alnulu_antigo(texto):
+    mapa = {
+        'A':1,'B':2,'C':3,'D':4,'E':5,'F':6,'G':7,'H':8,'I':9,
+        'J':-10,'K':11,'L':12,'M':-13,'N':14,'O':15,'P':16,
+        'Q':17,'R':18,'S':19,'T':20,'U':21,'V':-22,'W':23,
+        'X':24,'Y':-25,'Z':26,'.':2,'!':3,'?':4,',':1,';':1,':':1,'-':1,
+        '0':0,'1':1,'2':2,'3':3,'4':4,'5':5,'6':6,'7':7,'8':8,'9':9
+    }
+    equiv = {
+        'Á':'A','À':'A','Â':'A','Ã':'A','Ä':'A',
+        'É':'E','Ê':'E','È':'E',
+        'Í':'I','Ì':'I','Î':'I',
+        'Ó':'O','Ò':'O','Ô':'O','Õ':'O','Ö':'O',
+        'Ú':'U','Ù':'U','Û':'U','Ü':'U','Ç':'C','Ñ':'N'
+    }
+    total = 0
+    for c in texto.upper():
+        total += mapa.get(equiv.get(c, c), 0)
+    return total
+
+CORPUS = [
+    "Olá, Adam! Como você está hoje?",
+    "A ação da população foi discutida na reunião de São João.",
+    "ÁGUA, ÉTICA, ÍNDIO, ÓRGÃO, ÚTIL: maiúsculas acentuadas; À, Â, Ã, Ê, Ô, Õ, Ü, Ç, Ñ.",
+    "Não há coração que aguente tanta emoção — disse ela, às 9h30.",
+    "Straße e Fußball (ß vira SS ao passar para maiúsculas).",
+    "ﬁnanças e ﬂores: ligaduras que se expandem em FI e FL.",
+    "Números 0123456789 e pontuação: . ! ? , ; : -",
+    "Pôr-do-sol em Florianópolis; açaí, pão de queijo e guaraná.",
+    "",
+    "   ",
+    "日本語 e emoji 🙂 não valem nada.",
+    "sub\ud800rogado solto",
+]
+
+@pytest.mark.parametrize("texto", CORPUS)
+def test_calcular_alnulu_igual_ao_antigo(texto):
+    assert insepa.calcular_alnulu(texto) == alnulu_antigo(texto)
+
+def test_lote_igual_ao_antigo():
+    assert insepa.calcular_alnulu_lote(CORPUS) == [alnulu_antigo(t) for t in CORPUS]
+
+def test_lote_sem_numpy(monkeypatch):
+    monkeypatch.setattr(insepa, "np", None)
+    assert insepa.calcular_alnulu_lote(CORPUS) == [alnulu_antigo(t) for t in CORPUS]
+
+def test_lote_corpus_longo():
+    textos = [f"{t} {i}" for i in range(50) for t in CORPUS]
+    assert insepa.calcular_alnulu_lote(textos) == [alnulu_antigo(t) for t in textos]
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+import insepa
+
+def abrir(pasta, backend):
+    return insepa.abrir_subcon(
+        pasta / "memoria.json", pasta / "memoria.journal.jsonl", backend=backend, banco=pasta / "memoria.db"
+    )
+
+def serializar(mae):
+    return json.dumps(mae, default=insepa._codificar_tokens, sort_keys=True)
+
+SEGMENTOS = [
+    "Olá, Adam!", "Oi! Tudo bem?", "Como você está hoje?", "Estou ótimo — e você?",
+    "A reunião de São João foi adiada.", "Por quê?", "Choveu muito...", "日本語 e emoji 🙂.",
+    "Números 0123456789.", "Fim.", "Frase sem par",
+]
+
+# ────────────────────────────────────────────────────────────────────────────────
+# add_blocos igual a uma sequência de add_bloco
+# ────────────────────────────────────────────────────────────────────────────────
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+@pytest.mark.parametrize("estrategia, janela", [("consecutivos", 1), ("janela", 1), ("janela", 3)])
+def test_lote_igual_ao_bloco_a_bloco(tmp_path, backend, estrategia, janela):
+    pares = insepa.parear_segmentos(SEGMENTOS, estrategia, janela)
+    extras = {"re_ent": "sorriso", "ctx_ent": "", "re_sai": "", "ctx_sai": "conversa"}
+
+    (tmp_path / "lote").mkdir()
+    (tmp_path / "unitario").mkdir()
+    lote, unitario = abrir(tmp_path / "lote", backend), abrir(tmp_path / "unitario", backend)
+    for diario in (lote, unitario):
+        diario.registrar({
+            "op": "add_bloco", "mae_id": "0", "entrada": "Bloco já existente.",
+            "saidas": ["Antes do lote."], **extras
+        })
+
+    lote.registrar({"op": "add_blocos", "mae_id": "0", "pares": pares, **extras})
+    for entrada, saidas in pares:
+        unitario.registrar({"op": "add_bloco", "mae_id": "0", "entrada": entrada, "saidas": saidas, **extras})
+
+    assert serializar(lote.obter()["maes"]["0"]) == serializar(unitario.obter()["maes"]["0"])
+    # Também depois de reler do disco
+    assert serializar(abrir(tmp_path / "lote", backend).obter()["maes"]["0"]) == serializar(lote.obter()["maes"]["0"])
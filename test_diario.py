@@ -0,0 +1,146 @@
+import json
+
+import pytest
+
+import insepa
+
+def abrir(pasta, **kw):
+    return insepa.abrir_subcon(pasta / "memoria.json", pasta / "memoria.journal.jsonl", **kw)
+
+def add_bloco(entrada, saidas=(), mae_id="0"):
+    return {
+        "op": "add_bloco", "mae_id": mae_id, "entrada": entrada, "re_ent": "", "ctx_ent": "",
+        "saidas": list(saidas), "re_sai": "", "ctx_sai": ""
+    }
+
+def tokens_por_bloco(data, mae_id="0"):
+    return [
+        (b["bloco_id"], list(b["entrada"]["tokens"]["TOTAL"]), [list(s["tokens"]["TOTAL"]) for s in b["saidas"]])
+        for b in data["maes"][mae_id]["blocos"]
+    ]
+
+def serializar(data):
+    return json.dumps(data, default=insepa._codificar_tokens, sort_keys=True)
+
+def gravar_varias(diario):
+    mae = diario.registrar({"op": "add_mae", "nome": "Outra"})
+    for i in range(5):
+        diario.registrar(add_bloco(f"Frase {i}.", [f"Resposta {i}."]))
+    diario.registrar(add_bloco("Oi.", ["Oi!", "Olá!"], mae_id=mae))
+    diario.registrar({
+        "op": "update_bloco", "mae_id": "0", "bloco_id": 2,
+        "parte": "entrada", "chave": "texto", "valor": "Frase trocada."
+    })
+    diario.registrar({"op": "remove_blocos", "mae_id": "0", "inicio": 3, "fim": 3})
+    diario.registrar({"op": "rename_mae", "mae_id": mae, "nome": "Renomeada"})
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Falha no meio de uma operação
+# ────────────────────────────────────────────────────────────────────────────────
+def test_falha_ao_aplicar_descarta_a_memoria(tmp_path, monkeypatch):
+    diario = abrir(tmp_path)
+    diario.registrar(add_bloco("Olá Adam.", ["Olá!"]))
+
+    def saida_quebrada(*args):
+        raise IndexError("falha simulada")
+
+    # O bloco já foi acrescentado e o contador da mãe já andou quando a
+    # primeira saída falha
+    monkeypatch.setattr(insepa, "add_saida_to_block", saida_quebrada)
+    with pytest.raises(IndexError):
+        diario.registrar(add_bloco("Tudo bem?", ["Sim."]))
+    monkeypatch.undo()
+
+    data = diario.obter()
+    assert [b["entrada"]["texto"] for b in data["maes"]["0"]["blocos"]] == ["Olá Adam."]
+    assert data["maes"]["0"]["ultimo_child"] == "0.5"
+    assert diario.derivados["hashes"].blocos_com("0", "Tudo bem?", "", "") == []
+
+    # A próxima operação recebe os mesmos tokens que o replay em outro processo
+    diario.registrar(add_bloco("Tudo bem?", ["Sim."]))
+    assert tokens_por_bloco(abrir(tmp_path).obter()) == tokens_por_bloco(diario.obter())
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Caches consultados pelas threads de render
+# ────────────────────────────────────────────────────────────────────────────────
+def test_resumo_calculado_durante_escrita_nao_fica_velho(tmp_path, monkeypatch):
+    diario = abrir(tmp_path)
+    bloco  = diario.registrar(add_bloco("Olá Adam.", ["Olá!"]))
+    resumos, resumir = diario.derivados["resumos"], insepa.resumir_bloco
+
+    def resumir_com_escrita_no_meio(b):
+        # O render leu o bloco; outra sessão o edita antes de o resumo ser guardado
+        linha = resumir(b)
+        monkeypatch.setattr(insepa, "resumir_bloco", resumir)
+        diario.registrar({
+            "op": "update_bloco", "mae_id": "0", "bloco_id": bloco["bloco_id"],
+            "parte": "entrada", "chave": "texto", "valor": "Bom dia."
+        })
+        return linha
+
+    monkeypatch.setattr(insepa, "resumir_bloco", resumir_com_escrita_no_meio)
+    assert "Olá Adam." in resumos.resumo("0", bloco)
+    assert "Bom dia." in resumos.resumo("0", bloco)
+
+def test_previa_de_vista_antiga_nao_vaza_para_a_nova(tmp_path):
+    diario = insepa.abrir_inconsc(tmp_path / "inc.json", tmp_path / "inc.journal.jsonl")
+    previas = diario.derivados["previas"]
+    text_id = diario.registrar({"op": "add_texto", "texto": "Texto antigo."})
+    antiga  = diario.vista()["textos"][0]
+    diario.registrar({"op": "edit_texto", "id": text_id, "texto": "Texto novo."})
+    nova    = diario.vista()["textos"][0]
+    assert previas.previa(antiga) == "Texto antigo."
+    assert previas.previa(nova) == "Texto novo."
+    assert previas.previa(antiga) == "Texto antigo."
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Replay do diário
+# ────────────────────────────────────────────────────────────────────────────────
+def test_replay_reproduz_a_memoria_de_quem_gravou(tmp_path):
+    diario = abrir(tmp_path)
+    gravar_varias(diario)
+    outro = abrir(tmp_path)
+    assert serializar(outro.obter()) == serializar(diario.obter())
+    assert outro.derivados["hashes"].blocos_com("0", "Frase trocada.", "", "") == [2]
+    assert outro.derivados["hashes"].blocos_com("0", "Frase 2.", "", "") == []
+
+def test_outro_processo_alcanca_so_as_linhas_novas(tmp_path):
+    diario, outro = abrir(tmp_path), abrir(tmp_path)
+    diario.registrar(add_bloco("Primeira.", ["Um."]))
+    outro.obter()
+    diario.registrar(add_bloco("Segunda.", ["Dois."]))
+    outro.registrar(add_bloco("Terceira.", ["Três."]))
+    diario.obter()
+    assert serializar(outro.obter()) == serializar(diario.obter()) == serializar(abrir(tmp_path).obter())
+    assert [b["bloco_id"] for b in diario.obter()["maes"]["0"]["blocos"]] == [1, 2, 3]
+
+def test_linha_cortada_por_queda_e_ignorada(tmp_path):
+    diario = abrir(tmp_path)
+    diario.registrar(add_bloco("Antes.", ["Um."]))
+    with open(diario.diario, "ab") as f:
+        f.write(b'{"g": 0, "op": {"op": "add_bl')
+    diario.registrar(add_bloco("Depois.", ["Dois."]))
+    textos = [b["entrada"]["texto"] for b in abrir(tmp_path).obter()["maes"]["0"]["blocos"]]
+    assert textos == ["Antes.", "Depois."]
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Geração do snapshot
+# ────────────────────────────────────────────────────────────────────────────────
+def test_linhas_de_geracao_antiga_sao_puladas(tmp_path):
+    # Queda entre gravar o snapshot novo e truncar o diário: as linhas já
+    # estão no snapshot e não podem ser reaplicadas
+    diario = abrir(tmp_path)
+    gravar_varias(diario)
+    linhas = diario.diario.read_bytes()
+    diario.compactar()
+    assert diario.diario.read_bytes() == b""
+    esperado = serializar(diario.obter())
+    diario.diario.write_bytes(linhas)
+
+    outro = abrir(tmp_path)
+    assert outro.obter()["geracao"] == 1
+    assert serializar(outro.obter()) == serializar(diario.obter()) == esperado
+
+    # E as operações novas, da geração atual, continuam sendo reaplicadas
+    diario.registrar(add_bloco("Depois da compactação.", ["Ok."]))
+    assert serializar(outro.obter()) == serializar(diario.obter())
@@ -0,0 +1,35 @@
+import pytest
+
+import insepa
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Entradas iguais: só caixa, espaços ou forma Unicode mudam
+# ────────────────────────────────────────────────────────────────────────────────
+@pytest.mark.parametrize("a, b", [
+    ("Olá, Adam!", "olá, adam!"),
+    ("  Minha   avó\tchegou. ", "Minha avó chegou."),
+    ("ESTÁ AQUI", "está aqui"),
+    ("avó", "avó"),  # "ó" decomposto (NFD) e composto (NFC)
+])
+def test_mesmo_hash(a, b):
+    assert insepa.hash_entrada(a, "", "") == insepa.hash_entrada(b, "", "")
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Entradas diferentes: acentos distinguem palavras
+# ────────────────────────────────────────────────────────────────────────────────
+@pytest.mark.parametrize("a, b", [
+    ("Minha avó chegou.", "Minha avô chegou."),
+    ("Ele está aqui.", "Ele esta aqui."),
+    ("pôr do sol", "por do sol"),
+    ("maçã", "maca"),
+])
+def test_hash_diferente(a, b):
+    assert insepa.hash_entrada(a, "", "") != insepa.hash_entrada(b, "", "")
+
+def test_reacao_e_contexto_entram_no_hash():
+    assert insepa.hash_entrada("Oi", "sorriso", "") != insepa.hash_entrada("Oi", "", "sorriso")
+
+def test_filtrar_duplicados_mantem_palavras_acentuadas():
+    tabela = insepa.TabelaHashes(None)
+    pares  = [("Minha avó chegou.", ["a"]), ("Minha avô chegou.", ["b"]), ("minha AVÓ chegou.", ["c"])]
+    assert tabela.filtrar_duplicados("0", pares, "", "") == pares[:2]
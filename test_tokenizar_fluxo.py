@@ -0,0 +1,48 @@
+import io
+import random
+
+import pytest
+
+import insepa
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Texto aleatório: português, CJK, emoji, acentos combinantes e pontuação
+# ────────────────────────────────────────────────────────────────────────────────
+PEDACOS_TEXTO = [
+    "olá", "ação", "São", "João", "pôr-do-sol", "maçã", "ÁGUA", "Straße", "ﬁnanças", "9h30",
+    "日本語", "中文", "한국어", "🙂", "👩‍👩‍👧", "🇧🇷", "é", "ão", "ñ",
+    ".", "!", "?", "...", ",", ";", ":", "-", "—", "«", "»", "(", ")",
+    " ", "  ", "\n", "\t", "\r\n",
+]
+
+def texto_aleatorio(rng):
+    return "".join(rng.choice(PEDACOS_TEXTO) for _ in range(rng.randint(0, 60)))
+
+def em_pedacos(dados, rng):
+    i = 0
+    while i < len(dados):
+        n = rng.randint(1, 7)
+        yield dados[i:i + n]
+        i += n
+
+# ────────────────────────────────────────────────────────────────────────────────
+# tokenizar_fluxo igual ao caminho sem streaming, qualquer que seja o corte
+# ────────────────────────────────────────────────────────────────────────────────
+@pytest.mark.parametrize("semente", range(200))
+def test_fluxo_igual_ao_texto_inteiro(semente):
+    rng   = random.Random(semente)
+    texto = texto_aleatorio(rng)
+    saida = io.StringIO()
+    n, alnulu = insepa.tokenizar_fluxo(em_pedacos(texto.encode("utf-8"), rng), saida)
+    assert (n, alnulu) == (insepa.contar_unidades(texto), insepa.calcular_alnulu(texto))
+    assert saida.getvalue() == texto
+
+@pytest.mark.parametrize("tamanho", range(1, 8))
+def test_fluxo_pedacos_de_tamanho_fixo(tamanho):
+    texto = "".join(PEDACOS_TEXTO) * 3
+    dados = texto.encode("utf-8")
+    pedacos = [dados[i:i + tamanho] for i in range(0, len(dados), tamanho)]
+    assert insepa.tokenizar_fluxo(pedacos) == (insepa.contar_unidades(texto), insepa.calcular_alnulu(texto))
+
+def test_fluxo_vazio():
+    assert insepa.tokenizar_fluxo([]) == (0, 0)